@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import GithubAccount, Project, Deployment, Environment
+from .models import GithubAccount, Project, Deployment, Environment, ImageCache
 
 @admin.register(GithubAccount)
 class GithubAccountAdmin(admin.ModelAdmin):
@@ -15,7 +15,7 @@ class ProjectAdmin(admin.ModelAdmin):
 
 @admin.register(Deployment)
 class DeploymentAdmin(admin.ModelAdmin):
-    list_display = ('project', 'commit_hash', 'status', 'created_at')
+    list_display = ('project', 'commit_hash', 'status', 'image_size', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('project__name', 'commit_hash')
     date_hierarchy = 'created_at'
@@ -24,4 +24,10 @@ class DeploymentAdmin(admin.ModelAdmin):
 class EnvironmentAdmin(admin.ModelAdmin):
     list_display = ('project', 'name')
     list_filter = ('project',)
-    search_fields = ('project__name', 'name')
\ No newline at end of file
+    search_fields = ('project__name', 'name')
+
+@admin.register(ImageCache)
+class ImageCacheAdmin(admin.ModelAdmin):
+    list_display = ('project', 'image_tag', 'commit_hash', 'hit_count', 'last_used_at')
+    list_filter = ('framework_type',)
+    search_fields = ('project__name', 'commit_hash', 'cache_key')
\ No newline at end of file
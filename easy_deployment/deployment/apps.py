@@ -2,4 +2,6 @@ from django.apps import AppConfig
 
 class DeploymentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'deployment'
\ No newline at end of file
+    name = 'deployment'
+    def ready(self):
+        from . import signals  # noqa: F401
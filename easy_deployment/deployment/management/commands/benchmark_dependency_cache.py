@@ -0,0 +1,138 @@
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+import subprocess
+from django.core.management.base import BaseCommand, CommandError
+from deployment.services.build_context import BuildContext
+from deployment.services.container_service import ContainerService
+
+# Small but realistic dependency sets for each generated Dockerfile template
+FIXTURES = {
+    'python-django': {
+        'requirements.txt': "Django==4.2.16\ngunicorn==22.0.0\npsycopg2-binary==2.9.9\nrequests==2.32.3\n",
+    },
+    'python-flask': {
+        'requirements.txt': "Flask==3.0.3\ngunicorn==22.0.0\nSQLAlchemy==2.0.35\nrequests==2.32.3\n",
+    },
+    'node': {
+        'package.json': '{"name": "bench", "version": "1.0.0", "dependencies": '
+                        '{"express": "^4.19.2", "lodash": "^4.17.21", "axios": "^1.7.7"}}\n',
+    },
+    'mern': {
+        'package.json': '{"name": "bench", "version": "1.0.0", "dependencies": '
+                        '{"express": "^4.19.2", "mongoose": "^8.6.3", "react": "^18.3.1", "react-dom": "^18.3.1"}}\n',
+    },
+    'java-maven': {
+        'pom.xml': """<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <modelVersion>4.0.0</modelVersion>
+  <groupId>bench</groupId>
+  <artifactId>bench</artifactId>
+  <version>1.0.0</version>
+  <properties>
+    <maven.compiler.source>17</maven.compiler.source>
+    <maven.compiler.target>17</maven.compiler.target>
+  </properties>
+  <dependencies>
+    <dependency>
+      <groupId>org.apache.commons</groupId>
+      <artifactId>commons-lang3</artifactId>
+      <version>3.17.0</version>
+    </dependency>
+    <dependency>
+      <groupId>com.google.guava</groupId>
+      <artifactId>guava</artifactId>
+      <version>33.3.1-jre</version>
+    </dependency>
+  </dependencies>
+</project>
+""",
+    },
+}
+
+INSTALL_COMMANDS = ('pip install', 'npm install', 'mvn clean package')
+
+class Command(BaseCommand):
+    help = "Compare cold and warm dependency install times for each generated Dockerfile template with BuildKit cache mounts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--framework', action='append', choices=sorted(FIXTURES),
+                            help="Framework template to benchmark (repeatable, defaults to all)")
+        parser.add_argument('--runs', type=int, default=1, help="Warm builds to average per framework")
+
+    def handle(self, *args, **options):
+        service = ContainerService()
+        service.cache_mounts = True
+        # Mounts of our own, so the cold run starts empty without touching the caches real builds share
+        service.cache_mount_prefix = f"easy-deploy-benchmark-{uuid.uuid4().hex[:12]}"
+
+        self.stdout.write(f"{'framework':<16}{'cold (s)':>10}{'warm (s)':>10}{'speedup':>10}")
+        try:
+            for framework in options['framework'] or sorted(FIXTURES):
+                cold, warm = self._benchmark(service, framework, options['runs'])
+                speedup = f"{cold / warm:.1f}x" if warm else "-"
+                self.stdout.write(f"{framework:<16}{cold:>10.1f}{warm:>10.1f}{speedup:>10}")
+        finally:
+            self._prune_cache_mounts(service)
+
+    def _benchmark(self, service, framework, runs):
+        """Time the dependency install step with an empty cache mount, then with a warm one"""
+        build_dir = tempfile.mkdtemp()
+        image_tag = f"easy-deploy-benchmark:{framework}"
+        try:
+            for name, contents in FIXTURES[framework].items():
+                with open(os.path.join(build_dir, name), 'w') as f:
+                    f.write(contents)
+            with open(os.path.join(build_dir, 'Dockerfile'), 'w') as f:
+                f.write(self._dependency_stage(service.dockerfile_template(framework, 'bench')))
+
+            # The benchmark's mounts start empty; --no-cache below keeps image layers out of the comparison
+            cold = self._install_time(service, build_dir, framework, image_tag)
+            warm = sum(self._install_time(service, build_dir, framework, image_tag) for _ in range(runs)) / runs
+            return cold, warm
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            subprocess.run(['docker', 'image', 'rm', '--force', image_tag], capture_output=True)
+
+    def _prune_cache_mounts(self, service):
+        """Remove the benchmark's cache mounts, leaving every other build cache record alone"""
+        records = service.docker_client.df().get('BuildCache') or []
+        for record in records:
+            # BuildKit describes a cache mount as '... with id "/<mount id>"'
+            if record.get('Type') == 'exec.cachemount' and service.cache_mount_prefix in (record.get('Description') or ''):
+                subprocess.run(['docker', 'builder', 'prune', '--force', '--filter', f"id={record['ID']}"],
+                               capture_output=True)
+
+    def _dependency_stage(self, dockerfile):
+        """Cut a generated Dockerfile after its dependency install step"""
+        lines = []
+        for line in dockerfile.splitlines():
+            lines.append(line)
+            if line.startswith('RUN') and any(command in line for command in INSTALL_COMMANDS):
+                return "\n".join(lines) + "\n"
+        raise CommandError("Template has no dependency install step")
+
+    def _install_time(self, service, build_dir, framework, image_tag):
+        """Build without layer cache and return the duration BuildKit reports for the install step"""
+        output = []
+        context = BuildContext.from_directory(build_dir, framework)
+        started = time.monotonic()
+        try:
+            service._stream_buildkit_build(context, image_tag, None, output, no_cache=True)
+        finally:
+            context.close()
+        elapsed = time.monotonic() - started
+
+        install_step = None
+        for line in output:
+            step, _, message = line.partition(' ')
+            if message.startswith('[') and any(command in message for command in INSTALL_COMMANDS):
+                install_step = step
+            elif install_step and step == install_step:
+                match = re.match(r'DONE ([\d.]+)s', message)
+                if match:
+                    return float(match.group(1))
+        # Fall back to the whole build if the step timing was not reported
+        return elapsed
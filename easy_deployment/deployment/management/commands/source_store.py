@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from deployment.models import Project, Deployment
+from deployment.services.source_store import SourceStore
+
+class Command(BaseCommand):
+    help = "Report storage used by uploaded project sources and their dedup ratio, optionally collecting garbage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gc', action='store_true',
+                            help="Delete revisions no project or deployment references, and their unshared blobs")
+
+    def handle(self, *args, **options):
+        store = SourceStore()
+
+        if options['gc']:
+            keep = set(Project.objects.exclude(source_revision='').values_list('source_revision', flat=True))
+            keep.update(
+                Deployment.objects.filter(project__repository_url__startswith='local://')
+                .values_list('commit_hash', flat=True)
+            )
+            removed = store.collect_garbage(keep)
+            self.stdout.write(f"Removed {removed['revisions']} revisions and {removed['blobs']} blobs, "
+                              f"freed {removed['freed_bytes'] / (1024 * 1024):.1f} MB")
+
+        usage = store.usage()
+        self.stdout.write(f"Revisions:    {usage['revisions']}")
+        self.stdout.write(f"Files:        {usage['files']} ({usage['blobs']} distinct blobs)")
+        self.stdout.write(f"Logical size: {usage['logical_bytes'] / (1024 * 1024):.1f} MB")
+        self.stdout.write(f"Stored size:  {usage['stored_bytes'] / (1024 * 1024):.1f} MB")
+        self.stdout.write(f"Dedup ratio:  {usage['dedup_ratio']:.2f}x")
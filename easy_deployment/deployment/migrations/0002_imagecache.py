@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64, unique=True)),
+                ('image_tag', models.CharField(max_length=255)),
+                ('commit_hash', models.CharField(max_length=40)),
+                ('framework_type', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cached_images', to='deployment.project')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployment', '0002_imagecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='last_image_tag',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployment', '0003_project_last_image_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='image_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagecache',
+            name='image_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:17
+
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+
+
+def github_full_name(repository_url):
+    """Frozen copy of deployment.models.github_full_name as of this migration"""
+    parsed = urlparse(repository_url or '')
+    if parsed.hostname not in ('github.com', 'www.github.com'):
+        return ''
+    parts = [part for part in parsed.path.split('/') if part]
+    if len(parts) < 2:
+        return ''
+    return f"{parts[0]}/{parts[1].removesuffix('.git')}".lower()
+
+
+def populate_repository_full_name(apps, schema_editor):
+    Project = apps.get_model('deployment', 'Project')
+    for project in Project.objects.only('id', 'repository_url'):
+        project.repository_full_name = github_full_name(project.repository_url)
+        project.save(update_fields=['repository_full_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployment', '0004_image_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='repository_full_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['repository_full_name', 'branch'], name='deployment__reposit_b71463_idx'),
+        ),
+        migrations.RunPython(populate_repository_full_name, migrations.RunPython.noop),
+    ]
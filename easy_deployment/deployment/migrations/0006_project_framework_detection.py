@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployment', '0005_project_repository_full_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='framework_detection',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
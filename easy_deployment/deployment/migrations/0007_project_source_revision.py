@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployment', '0006_project_framework_detection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='source_revision',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+    ]
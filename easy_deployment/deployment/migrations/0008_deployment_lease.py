@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployment', '0007_project_source_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deployment',
+            name='worker_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='deployment',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='deployment__status_a2d9bd_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployment', '0008_deployment_lease'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deployment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('building', 'Building'), ('deploying', 'Deploying'), ('deployed', 'Deployed'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=20),
+        ),
+    ]
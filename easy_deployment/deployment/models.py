@@ -1,6 +1,17 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from urllib.parse import urlparse
+
+def github_full_name(repository_url):
+    """Normalize a GitHub repository URL to a lowercase "owner/repo", or '' for anything else"""
+    parsed = urlparse(repository_url or '')
+    if parsed.hostname not in ('github.com', 'www.github.com'):
+        return ''
+    parts = [part for part in parsed.path.split('/') if part]
+    if len(parts) < 2:
+        return ''
+    return f"{parts[0]}/{parts[1].removesuffix('.git')}".lower()
 
 class GithubAccount(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='github_account')
@@ -24,10 +35,27 @@ class Project(models.Model):
         ('other', 'Other')
     ], default='node')
     branch = models.CharField(max_length=100, default='main')
+    last_image_tag = models.CharField(max_length=255, blank=True)
+    repository_full_name = models.CharField(max_length=255, blank=True, editable=False)
+    framework_detection = models.JSONField(default=dict, blank=True)  # last detection result and its commit
+    source_revision = models.CharField(max_length=40, blank=True)  # uploaded projects: current source store manifest
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['repository_full_name', 'branch']),
+        ]
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        # Kept in sync with the URL so push webhooks can find projects through the index
+        self.repository_full_name = github_full_name(self.repository_url)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'repository_url' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'repository_full_name'}
+        super().save(*args, **kwargs)
+    
     def update_last_deployed(self):
         self.last_deployed = timezone.now()
         self.save(update_fields=['last_deployed'])
@@ -49,7 +77,8 @@ class Deployment(models.Model):
         ('building', 'Building'),
         ('deploying', 'Deploying'),
         ('deployed', 'Deployed'),
-        ('failed', 'Failed')
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped')
     ]
     
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='deployments')
@@ -61,6 +90,14 @@ class Deployment(models.Model):
     logs = models.TextField(blank=True)
     environment = models.ForeignKey(Environment, on_delete=models.SET_NULL, null=True, related_name='deployments')
     container_id = models.CharField(max_length=100, null=True, blank=True)
+    image_size = models.BigIntegerField(null=True, blank=True)  # bytes
+    worker_id = models.CharField(max_length=255, blank=True)  # worker that claimed the deployment
+    lease_expires_at = models.DateTimeField(null=True, blank=True)  # claim is up for grabs once this passes; on a pending deployment, not claimable before it
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
     
     def __str__(self):
         return f"{self.project.name} - {self.commit_hash[:7]} ({self.status})"
@@ -77,4 +114,24 @@ class Deployment(models.Model):
         self.completed_at = timezone.now()
         if error_logs:
             self.logs += f"\n{error_logs}"
-        self.save(update_fields=['status', 'completed_at', 'logs'])
\ No newline at end of file
+        self.save(update_fields=['status', 'completed_at', 'logs'])
+
+class ImageCache(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='cached_images')
+    cache_key = models.CharField(max_length=64, unique=True)
+    image_tag = models.CharField(max_length=255)
+    commit_hash = models.CharField(max_length=40)
+    framework_type = models.CharField(max_length=50)
+    image_size = models.BigIntegerField(null=True, blank=True)  # bytes
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    hit_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.project.name} - {self.image_tag}"
+    
+    def mark_used(self):
+        self.last_used_at = timezone.now()
+        self.hit_count = models.F('hit_count') + 1
+        self.save(update_fields=['last_used_at', 'hit_count'])
+        self.refresh_from_db(fields=['hit_count'])
@@ -31,9 +31,9 @@ class DeploymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Deployment
         fields = ['id', 'commit_hash', 'status', 'created_at', 'completed_at', 
-                  'deployment_url', 'logs', 'environment_name']
+                  'deployment_url', 'logs', 'environment_name', 'image_size']
         read_only_fields = ['id', 'created_at', 'completed_at', 'status', 
-                           'deployment_url', 'logs']
+                           'deployment_url', 'logs', 'image_size']
 
 class ProjectSerializer(serializers.ModelSerializer):
     latest_deployment = DeploymentSerializer(read_only=True)
@@ -44,8 +44,8 @@ class ProjectSerializer(serializers.ModelSerializer):
         model = Project
         fields = ['id', 'name', 'repository_url', 'framework_type', 'branch',
                   'created_at', 'last_deployed', 'owner_username', 'latest_deployment',
-                  'environments']
-        read_only_fields = ['id', 'created_at', 'last_deployed', 'owner_username']
+                  'environments', 'framework_detection']
+        read_only_fields = ['id', 'created_at', 'last_deployed', 'owner_username', 'framework_detection']
     
     def get_latest_deployment(self, obj):
         latest = obj.deployments.order_by('-created_at').first()
@@ -0,0 +1,189 @@
+import io
+import os
+import time
+import logging
+import tarfile
+from docker.utils.build import PatternMatcher, create_archive, exclude_paths
+
+logger = logging.getLogger(__name__)
+
+# Never sent to the daemon: VCS metadata, local secrets and editor/OS clutter
+DEFAULT_IGNORE_PATTERNS = [
+    '.git',
+    '**/.env',
+    '**/.env.*',
+    '**/.DS_Store',
+]
+
+# Dependency and build output directories that the generated Dockerfiles recreate inside the image
+FRAMEWORK_IGNORE_PATTERNS = {
+    'python': ['**/__pycache__', '**/*.pyc', '.venv', 'venv', '.pytest_cache', '.tox', '.mypy_cache'],
+    'node': ['**/node_modules', '.next/cache', 'npm-debug.log*', 'yarn-error.log*', 'coverage'],
+    'mern': ['**/node_modules', 'npm-debug.log*', 'yarn-error.log*', 'coverage'],
+    'java': ['target', '.gradle', '.idea'],
+}
+
+# Streamed contexts never hold more than this much of a file in memory at once
+STREAM_CHUNK_SIZE = 64 * 1024
+
+class BuildContext:
+    """A filtered build context tarball ready to be streamed to the Docker daemon"""
+
+    def __init__(self, fileobj=None, stream=None, entry_count=0, duration=0.0):
+        self.fileobj = fileobj
+        self.stream = stream
+        self.entry_count = entry_count
+        self.duration = duration
+        self.size = 0
+        if self.fileobj:
+            self.fileobj.seek(0, os.SEEK_END)
+            self.size = self.fileobj.tell()
+            self.fileobj.seek(0)
+
+    @property
+    def streaming(self):
+        """Streamed contexts are generated while the daemon reads them, so their size is known only afterwards"""
+        return self.stream is not None
+
+    def payload(self):
+        """What to send as the request body: the tarball file or a generator of tar chunks"""
+        return self.stream if self.streaming else self.fileobj
+
+    @classmethod
+    def default_ignore_patterns(cls, framework):
+        return DEFAULT_IGNORE_PATTERNS + FRAMEWORK_IGNORE_PATTERNS.get(framework.split('-')[0], [])
+
+    @classmethod
+    def parse_dockerignore(cls, contents):
+        return [
+            line.strip() for line in contents.splitlines()
+            if line.strip() and not line.strip().startswith('#')
+        ]
+
+    @classmethod
+    def ignore_patterns(cls, context_dir, framework):
+        """Merge the default and framework ignore lists with the project's own .dockerignore"""
+        patterns = cls.default_ignore_patterns(framework)
+
+        # User patterns come last so their "!" exceptions can re-include defaults
+        dockerignore_path = os.path.join(context_dir, '.dockerignore')
+        if os.path.exists(dockerignore_path):
+            with open(dockerignore_path) as f:
+                patterns += cls.parse_dockerignore(f.read())
+        return patterns
+
+    @classmethod
+    def from_directory(cls, context_dir, framework, dockerfile='Dockerfile'):
+        """Tar the files of a directory that survive the ignore rules"""
+        started = time.monotonic()
+        patterns = cls.ignore_patterns(context_dir, framework)
+        files = sorted(exclude_paths(context_dir, patterns, dockerfile=dockerfile))
+        fileobj = create_archive(root=context_dir, files=files, gzip=False)
+        return cls(fileobj=fileobj, entry_count=len(files), duration=time.monotonic() - started)
+
+    @classmethod
+    def from_archive(cls, archive, framework, dockerfile, dockerignore='', strip_components=1, subdirectory=''):
+        """Rewrite a gzipped source tarball into a build context on the fly, without touching disk"""
+        context = cls()
+        patterns = cls.default_ignore_patterns(framework) + cls.parse_dockerignore(dockerignore)
+        entries = cls._tar_entries(archive, strip_components)
+        context.stream = context._transcode(entries, PatternMatcher(patterns), dockerfile, subdirectory.strip('/'))
+        return context
+
+    @classmethod
+    def from_manifest(cls, store, revision, framework, dockerfile, subdirectory=''):
+        """Assemble a build context from a stored source revision, reading each file from its blob"""
+        context = cls()
+        subdirectory = subdirectory.strip('/')
+        dockerignore = store.read_file(revision, f"{subdirectory}/.dockerignore" if subdirectory else '.dockerignore') or ''
+        patterns = cls.default_ignore_patterns(framework) + cls.parse_dockerignore(dockerignore)
+        entries = cls._manifest_entries(store, revision)
+        context.stream = context._transcode(entries, PatternMatcher(patterns), dockerfile, subdirectory)
+        return context
+
+    @classmethod
+    def _manifest_entries(cls, store, revision):
+        for entry in store.manifest(revision):
+            info = tarfile.TarInfo()
+            info.size = entry['size']
+            info.mode = entry['mode']
+            with store.open_blob(entry['sha256']) as fileobj:
+                yield entry['path'], info, fileobj
+
+    @classmethod
+    def _tar_entries(cls, archive, strip_components):
+        with tarfile.open(fileobj=archive, mode='r|gz') as source:
+            for member in source:
+                # Source archives wrap the tree in a top-level directory such as "<owner>-<repo>-<sha>/"
+                parts = member.name.split('/')[strip_components:]
+                yield '/'.join(part for part in parts if part), member, source.extractfile(member) if member.isfile() else None
+
+    def _transcode(self, entries, matcher, dockerfile, subdirectory):
+        """Write (name, TarInfo, file) entries out as an uncompressed tar stream, one bounded chunk at a time"""
+        started = time.monotonic()
+        has_dockerfile = False
+
+        for name, info, fileobj in entries:
+            # Monorepo builds keep only the app's directory, re-rooted at the top of the context
+            if subdirectory:
+                if not name.startswith(f"{subdirectory}/"):
+                    continue
+                name = name[len(subdirectory) + 1:]
+            if not name or self._excluded(matcher, name):
+                continue
+
+            if name == 'Dockerfile':
+                has_dockerfile = True
+            info.name = name
+            yield from self._tar_entry(info, fileobj)
+
+        if not has_dockerfile:
+            data = dockerfile.encode('utf-8')
+            info = tarfile.TarInfo('Dockerfile')
+            info.size = len(data)
+            info.mtime = int(time.time())
+            yield from self._tar_entry(info, io.BytesIO(data))
+
+        # End-of-archive marker
+        end = tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+        self.size += len(end)
+        self.duration = time.monotonic() - started
+        yield end
+
+    def _tar_entry(self, info, fileobj):
+        """Yield one tar member: its header, then its data in fixed-size chunks, then block padding"""
+        header = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+        self.size += len(header)
+        self.entry_count += 1
+        yield header
+
+        if fileobj is None or not info.isfile():
+            return
+        remaining = info.size
+        while remaining > 0:
+            chunk = fileobj.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise tarfile.ReadError(f"Unexpected end of data for {info.name}")
+            remaining -= len(chunk)
+            self.size += len(chunk)
+            yield chunk
+
+        padding = -info.size % tarfile.BLOCKSIZE
+        if padding:
+            self.size += padding
+            yield tarfile.NUL * padding
+
+    def _excluded(self, matcher, name):
+        # Like `docker build`, a file is dropped when it or any directory above it is ignored
+        parts = name.split('/')
+        return any(matcher.matches('/'.join(parts[:depth])) for depth in range(1, len(parts) + 1))
+
+    def summary(self):
+        verb = "streamed" if self.streaming else "prepared"
+        return f"Build context: {self.entry_count} entries, {self.size / (1024 * 1024):.1f} MB, {verb} in {self.duration:.2f}s"
+
+    def close(self):
+        if self.fileobj:
+            self.fileobj.close()
+        if self.stream:
+            self.stream.close()
@@ -1,38 +1,84 @@
 import os
 import subprocess
 import logging
+import hashlib
+import json
 import docker
 import tempfile
 import shutil
+import threading
 from django.conf import settings
+from .build_context import BuildContext
+from .deployment_log import BuildLog, BuildCancelled
 
 logger = logging.getLogger(__name__)
 
+# Bump when generated Dockerfiles or build behaviour change so stale images are not reused
+BUILD_CACHE_VERSION = '1'
+
+# One framework per generated Dockerfile template, used to derive the base images to pre-pull
+TEMPLATE_FRAMEWORKS = ['python-django', 'python-flask', 'node', 'java-maven', 'static', 'mern', 'lamp', 'other']
+
+# BuildKit cache mounts shared by every build on the host, one per package manager
+PACKAGE_CACHE_MOUNTS = {
+    'pip': 'type=cache,id={prefix}-pip,target=/root/.cache/pip',
+    'npm': 'type=cache,id={prefix}-npm,target=/root/.npm',
+    'maven': 'type=cache,id={prefix}-maven,target=/root/.m2,sharing=locked',
+}
+DEFAULT_CACHE_MOUNT_PREFIX = 'easy-deploy'
+
 class ContainerService:
     def __init__(self):
         self.docker_client = docker.from_env()
         self.base_container_port = settings.BASE_CONTAINER_PORT
         self.deployment_domain = settings.DEPLOYMENT_DOMAIN
         self.nginx_proxy_network = settings.NGINX_PROXY_NETWORK
+        self.cache_mounts = settings.DOCKER_BUILD_CACHE_MOUNTS
+        self.cache_mount_prefix = DEFAULT_CACHE_MOUNT_PREFIX
     
-    def _write_dockerfile(self, repo_dir, framework, project_name="default_project"):
-        """Write an appropriate Dockerfile based on the detected framework"""
-        dockerfile_path = os.path.join(repo_dir, 'Dockerfile')
-        
-        # If Dockerfile exists, use it
-        if os.path.exists(dockerfile_path):
-            return dockerfile_path
+    def _cached_run(self, package_manager, command, uncached_command=None):
+        """Render a dependency install step, using a shared BuildKit cache mount when enabled"""
+        if self.cache_mounts:
+            return f"RUN --mount={PACKAGE_CACHE_MOUNTS[package_manager].format(prefix=self.cache_mount_prefix)} {command}"
+        return f"RUN {uncached_command or command}"
+    
+    def dockerfile_template(self, framework, project_name="default_project"):
+        """Return the generated Dockerfile contents for a framework"""
+        template = self._framework_dockerfile(framework, project_name)
+        if self.cache_mounts:
+            # Parser directives must come before anything else, including blank lines
+            return f"# syntax=docker/dockerfile:1{template}"
+        return template
+    
+    def _framework_dockerfile(self, framework, project_name):
+        """Render the Dockerfile template for a framework"""
+        pip_install = self._cached_run(
+            'pip', 'pip install -r requirements.txt', 'pip install --no-cache-dir -r requirements.txt'
+        )
+        npm_install = self._cached_run('npm', 'npm install')
+        npm_ci = self._cached_run('npm', 'if [ -f package-lock.json ]; then npm ci; else npm install; fi')
+        maven_package = self._cached_run('maven', 'mvn clean package -DskipTests')
         
-        # Create framework-specific Dockerfile
-        with open(dockerfile_path, 'w') as f:
-            if framework.startswith('python-django'):
-                f.write(f"""
-FROM python:3.10-slim
+        if framework.startswith('python-django'):
+            return f"""
+FROM python:3.10-slim AS build
 
 WORKDIR /app
 
+# Compilers are only needed to build wheels and never reach the runtime image
+RUN apt-get update && apt-get install -y --no-install-recommends build-essential && rm -rf /var/lib/apt/lists/*
+RUN python -m venv /opt/venv
+ENV PATH="/opt/venv/bin:$PATH"
+
 COPY requirements.txt .
-RUN pip install --no-cache-dir -r requirements.txt
+{pip_install}
+
+FROM python:3.10-slim
+
+WORKDIR /app
+
+ENV PATH="/opt/venv/bin:$PATH" PYTHONDONTWRITEBYTECODE=1 PYTHONUNBUFFERED=1
+COPY --from=build /opt/venv /opt/venv
 
 COPY . .
 
@@ -43,15 +89,27 @@ RUN python manage.py collectstatic --noinput
 RUN python manage.py migrate
 
 CMD ["gunicorn", "--bind", "0.0.0.0:8000", "{project_name}.wsgi:application"]
-                """)
-            elif framework.startswith('python-flask'):
-                f.write("""
-FROM python:3.10-slim
+            """
+        elif framework.startswith('python-flask'):
+            return f"""
+FROM python:3.10-slim AS build
 
 WORKDIR /app
 
+# Compilers are only needed to build wheels and never reach the runtime image
+RUN apt-get update && apt-get install -y --no-install-recommends build-essential && rm -rf /var/lib/apt/lists/*
+RUN python -m venv /opt/venv
+ENV PATH="/opt/venv/bin:$PATH"
+
 COPY requirements.txt .
-RUN pip install --no-cache-dir -r requirements.txt
+{pip_install}
+
+FROM python:3.10-slim
+
+WORKDIR /app
+
+ENV PATH="/opt/venv/bin:$PATH" PYTHONDONTWRITEBYTECODE=1 PYTHONUNBUFFERED=1
+COPY --from=build /opt/venv /opt/venv
 
 COPY . .
 
@@ -59,50 +117,67 @@ ENV FLASK_APP=app.py
 ENV FLASK_ENV=production
 
 CMD ["gunicorn", "--bind", "0.0.0.0:8000", "app:app"]
-                """)
-            elif framework.startswith('node'):
-                f.write("""
-FROM node:16-alpine
+            """
+        elif framework.startswith('node'):
+            return f"""
+FROM node:16-alpine AS build
 
 WORKDIR /app
 
 COPY package*.json ./
-RUN npm install
+{npm_ci}
 
 COPY . .
 
 # Build step for frameworks like React, Next.js
-RUN if [ -f "next.config.js" ]; then npm run build; elif [ -f "vite.config.js" ]; then npm run build; elif [ -f "package.json" ]; then npm run build; fi
+RUN npm run build --if-present
+
+# Drop dev dependencies and build caches, then collect what the app needs at runtime:
+# Next.js apps only need their build output, other apps run from their sources
+RUN npm prune --omit=dev && rm -rf .next/cache && mkdir /runtime && \
+    if [ -d .next ]; then \
+        cp -r package*.json node_modules .next /runtime/ && \
+        for f in public next.config.js next.config.mjs; do if [ -e "$f" ]; then cp -r "$f" /runtime/; fi; done; \
+    else \
+        cp -r . /runtime/; \
+    fi
+
+FROM node:16-alpine
+
+WORKDIR /app
+
+ENV NODE_ENV=production
+COPY --from=build /runtime ./
 
 # Set the appropriate start command
 CMD if [ -f "next.config.js" ]; then npm start; elif [ -f "package.json" ]; then npm start; else node index.js; fi
-                """)
-            elif framework.startswith('java'):
-                f.write("""
+            """
+        elif framework.startswith('java'):
+            return f"""
 FROM maven:3.8-openjdk-17 AS build
 WORKDIR /app
 COPY . .
-RUN mvn clean package -DskipTests
+{maven_package}
 
 FROM openjdk:17-slim
 WORKDIR /app
 COPY --from=build /app/target/*.jar app.jar
 CMD ["java", "-jar", "app.jar"]
-                """)
-            elif framework == 'static':
-                f.write("""
+            """
+        elif framework == 'static':
+            return """
 FROM nginx:alpine
 COPY . /usr/share/nginx/html
-                """)
-            elif framework == 'mern':
-                f.write("""
+            """
+        elif framework == 'mern':
+            return f"""
 FROM node:16-alpine as builder
 
 WORKDIR /app
 
 # Install dependencies for both frontend and backend
 COPY package*.json ./
-RUN npm install
+{npm_install}
 
 # Copy source files
 COPY . .
@@ -126,9 +201,9 @@ ENV PORT=8000
 
 EXPOSE 8000
 CMD ["node", "server/index.js"]
-                """)
-            elif framework == 'lamp':
-                f.write("""
+            """
+        elif framework == 'lamp':
+            return """
 FROM php:8.0-apache
 
 # Install system dependencies
@@ -164,97 +239,311 @@ ENV APACHE_DOCUMENT_ROOT /var/www/html
 
 EXPOSE 80
 CMD ["apache2-foreground"]
-                """)
-            else:
-                # Generic fallback
-                f.write("""
+            """
+        else:
+            # Generic fallback
+            return """
 FROM ubuntu:20.04
 WORKDIR /app
 COPY . .
 CMD ["bash", "-c", "echo 'Application running. Configure container as needed.' && sleep infinity"]
-                """)
+            """
+    
+    def base_images(self):
+        """Return every external base image referenced by the generated Dockerfile templates"""
+        images = set()
+        for framework in TEMPLATE_FRAMEWORKS:
+            stages = set()
+            for line in self.dockerfile_template(framework).splitlines():
+                # BuildKit pulls the Dockerfile frontend named by the syntax directive as well
+                if line.startswith('# syntax='):
+                    images.add(line.split('=', 1)[1].strip())
+                    continue
+                parts = line.split()
+                if len(parts) < 2 or parts[0].upper() != 'FROM':
+                    continue
+                # Skip references to earlier stages of the same multi-stage build
+                if parts[1] not in stages:
+                    images.add(parts[1])
+                if len(parts) >= 4 and parts[2].upper() == 'AS':
+                    stages.add(parts[3])
+        return sorted(images)
+    
+    def _write_dockerfile(self, repo_dir, framework, project_name="default_project"):
+        """Write an appropriate Dockerfile based on the detected framework"""
+        dockerfile_path = os.path.join(repo_dir, 'Dockerfile')
+        
+        # If Dockerfile exists, use it
+        if os.path.exists(dockerfile_path):
+            return dockerfile_path
+        
+        # Create framework-specific Dockerfile
+        with open(dockerfile_path, 'w') as f:
+            f.write(self.dockerfile_template(framework, project_name))
         
         return dockerfile_path
     
-    def build_and_run(self, repo_dir, project_name, deployment_id, framework, environment=None):
-        """Build a container image and run it"""
-        logs = []
-        container_id = None
+    def _safe_name(self, project_name):
+        """Sanitize a project name for use in Docker image and container names"""
+        return project_name.lower().replace(' ', '-')
+    
+    def build_cache_key(self, commit_hash, framework, project_name, build_inputs=None):
+        """Compute a content-addressed key for the image a build would produce"""
+        # A user-supplied Dockerfile is part of the commit, so the commit hash
+        # already covers it; generated Dockerfiles are hashed from their template.
+        payload = {
+            'version': BUILD_CACHE_VERSION,
+            'commit': commit_hash,
+            'framework': framework,
+            'dockerfile': self.dockerfile_template(framework, project_name),
+            'build_inputs': build_inputs or {},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def image_tag_for(self, project_name, cache_key):
+        """Return the image tag used for a given build cache key"""
+        return f"{self._safe_name(project_name)}:{cache_key[:12]}"
+    
+    def cache_tag_for(self, project_id):
+        """Return the stable per-project tag that always points at the latest build"""
+        # Keyed by id rather than name, so projects of different owners that share a name never share cache sources
+        return f"project-{project_id}:cache"
+    
+    def _stream_build(self, context, image_tag, cache_from, logs):
+        """Build an image from a prepared context, forwarding build output to the logs as it arrives"""
+        if self.cache_mounts:
+            return self._stream_buildkit_build(context, image_tag, cache_from, logs)
+        return self._stream_api_build(context, image_tag, cache_from, logs)
+    
+    def _stream_buildkit_build(self, context, image_tag, cache_from, logs, no_cache=False):
+        """Build an image with the BuildKit CLI, which the Docker API client cannot drive"""
+        # Embed cache metadata in the image so later builds can use it with --cache-from
+        command = ['docker', 'build', '--progress=plain', '--tag', image_tag, '--build-arg', 'BUILDKIT_INLINE_CACHE=1']
+        for source in cache_from or []:
+            command += ['--cache-from', source]
+        if no_cache:
+            command.append('--no-cache')
+        # Read the context tarball from stdin
+        command.append('-')
         
+        steps = set()
+        cached = set()
+        output = []
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE if context.streaming else context.fileobj,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env={**os.environ, 'DOCKER_BUILDKIT': '1'}
+        )
+        if context.streaming:
+            feeder = threading.Thread(target=self._feed_context, args=(context, process.stdin), daemon=True)
+            feeder.start()
         try:
-            # Sanitize project name for Docker
-            safe_project_name = f"{project_name.lower().replace(' ', '-')}-{deployment_id}"
-            
-            # Write appropriate Dockerfile if it doesn't exist
-            dockerfile_path = self._write_dockerfile(repo_dir, framework, project_name)
-            logs.append(f"Created Dockerfile for {framework}")
-            
-            # Build the Docker image
-            logs.append("Building Docker image...")
-            image_tag = f"{safe_project_name}:latest"
-            
-            self.docker_client.images.build(
-                path=repo_dir,
-                tag=image_tag,
-                rm=True
-            )
-            logs.append("Docker image built successfully")
-            
-            # Stop existing container if it exists
+            for line in process.stdout:
+                line = line.rstrip()
+                if not line:
+                    continue
+                logs.append(line)
+                output.append(line)
+                
+                # Plain progress output prefixes every line with its step number, e.g. "#7 [3/5] RUN ..."
+                step, _, message = line.partition(' ')
+                if message.startswith('[') and not message.startswith('[internal]'):
+                    steps.add(step)
+                elif message == 'CACHED':
+                    cached.add(step)
+        except BuildCancelled:
+            # Stop the build itself, not just our reading of its output
+            process.kill()
+            process.wait()
+            if context.streaming:
+                feeder.join()
+            raise
+        
+        if context.streaming:
+            feeder.join()
+        if process.wait() != 0:
+            raise docker.errors.BuildError(f"docker build exited with status {process.returncode}", output[-20:])
+        
+        return self.docker_client.images.get(image_tag), len(cached & steps), len(steps)
+    
+    def _feed_context(self, context, stdin):
+        """Pipe a streamed context into the build process as its chunks are produced"""
+        try:
+            for chunk in context.stream:
+                stdin.buffer.write(chunk)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            logger.error(f"Error streaming build context: {str(e)}")
+        finally:
             try:
-                existing_container = self.docker_client.containers.get(safe_project_name)
-                logs.append(f"Stopping existing container {safe_project_name}")
-                existing_container.stop()
-                existing_container.remove()
-            except docker.errors.NotFound:
+                stdin.close()
+            except BrokenPipeError:
                 pass
-            
-            # Determine port
-            container_port = self.base_container_port + deployment_id
-            
-            # Prepare environment variables
-            env_vars = environment or {}
-            
-            # Add standard environment variables
+    
+    def _stream_api_build(self, context, image_tag, cache_from, logs):
+        """Build an image with the low-level API, forwarding build output as it arrives"""
+        cached_steps = 0
+        total_steps = 0
+        build_stream = self.docker_client.api.build(
+            fileobj=context.payload(),
+            custom_context=True,
+            tag=image_tag,
+            rm=True,
+            cache_from=cache_from,
+            decode=True
+        )
+        
+        try:
+            for chunk in build_stream:
+                if 'error' in chunk:
+                    raise docker.errors.BuildError(chunk['error'].strip(), [chunk])
+                
+                output = chunk.get('stream') or chunk.get('status') or ''
+                for line in output.splitlines():
+                    if not line.strip():
+                        continue
+                    logs.append(line.rstrip())
+                    if line.startswith('Step '):
+                        total_steps += 1
+                    elif 'Using cache' in line:
+                        cached_steps += 1
+        except BuildCancelled:
+            # Dropping the connection makes the daemon abandon the build
+            build_stream.close()
+            raise
+        
+        return self.docker_client.images.get(image_tag), cached_steps, total_steps
+    
+    def image_size(self, image_tag):
+        """Return the size of an image in bytes, or None if it cannot be inspected"""
+        try:
+            return self.docker_client.images.get(image_tag).attrs.get('Size')
+        except docker.errors.APIError as e:
+            logger.error(f"Error inspecting image {image_tag}: {str(e)}")
+            return None
+    
+    def image_exists(self, image_tag):
+        """Check whether an image is present on the Docker host"""
+        try:
+            self.docker_client.images.get(image_tag)
+            return True
+        except docker.errors.ImageNotFound:
+            return False
+    
+    def _start_container(self, image_tag, project_name, deployment_id, framework, environment, logs):
+        """Replace any existing container for the deployment and start a new one from the image"""
+        safe_project_name = f"{self._safe_name(project_name)}-{deployment_id}"
+        
+        # Stop existing container if it exists
+        try:
+            existing_container = self.docker_client.containers.get(safe_project_name)
+            logs.append(f"Stopping existing container {safe_project_name}")
+            existing_container.stop()
+            existing_container.remove()
+        except docker.errors.NotFound:
+            pass
+        
+        # Determine port
+        container_port = self.base_container_port + deployment_id
+        
+        # Prepare environment variables
+        env_vars = environment or {}
+        
+        # Add standard environment variables
+        env_vars.update({
+            'PORT': '8000',  # Standard port inside container
+            'HOST': '0.0.0.0',
+            'NODE_ENV': 'production',
+            'DEPLOYMENT_ID': str(deployment_id),
+            'PROJECT_NAME': project_name
+        })
+        
+        # Add MERN-specific environment variables
+        if framework == 'mern':
             env_vars.update({
-                'PORT': '8000',  # Standard port inside container
-                'HOST': '0.0.0.0',
+                'MONGODB_URI': environment.get('MONGODB_URI', 'mongodb://localhost:27017/app'),
+                'JWT_SECRET': environment.get('JWT_SECRET', 'default-secret'),
                 'NODE_ENV': 'production',
-                'DEPLOYMENT_ID': str(deployment_id),
-                'PROJECT_NAME': project_name
+                'PORT': '8000',
+                'REACT_APP_API_URL': f"https://{safe_project_name}.{self.deployment_domain}"
             })
+        
+        # Run the container
+        logs.append(f"Starting container {safe_project_name} on port {container_port}")
+        container = self.docker_client.containers.run(
+            image_tag,
+            name=safe_project_name,
+            detach=True,
+            environment=env_vars,
+            network=self.nginx_proxy_network,
+            ports={
+                '8000/tcp': container_port
+            },
+            labels={
+                'traefik.enable': 'true',
+                f'traefik.http.routers.{safe_project_name}.rule': f'Host(`{safe_project_name}.{self.deployment_domain}`)',
+                f'traefik.http.services.{safe_project_name}.loadbalancer.server.port': '8000'
+            }
+        )
+        
+        logs.append(f"Container {safe_project_name} started successfully")
+        return container.id
+    
+    def _build_image(self, context, project_name, deployment_id, image_tag, cache_from, logs, project_id=None):
+        """Build an image from a context and point the project's cache tag at it"""
+        logs.append("Building Docker image...")
+        if not image_tag:
+            image_tag = f"{self._safe_name(project_name)}-{deployment_id}:latest"
+        
+        # Seed the layer cache from the project's stable cache tag and last good image
+        cache_tag = self.cache_tag_for(project_id) if project_id is not None else None
+        cache_sources = ([cache_tag] if cache_tag else []) + [source for source in (cache_from or []) if source != cache_tag]
+        
+        if not context.streaming:
+            logs.append(context.summary())
+        try:
+            image, cached_steps, total_steps = self._stream_build(context, image_tag, cache_sources, logs)
+        finally:
+            context.close()
+        if context.streaming:
+            logs.append(context.summary())
+        logs.append(f"Docker image built successfully ({image.attrs.get('Size', 0) / (1024 * 1024):.1f} MB)")
+        logs.append(f"Layer cache: {cached_steps}/{total_steps} build steps reused")
+        
+        if cache_tag:
+            repository, tag = cache_tag.split(':')
+            image.tag(repository, tag=tag)
+        return image_tag
+    
+    def build_directory(self, repo_dir, project_name, deployment_id, framework, image_tag=None, cache_from=None, log_writer=None, app_path='', cancel_event=None, project_id=None):
+        """Build an image from a checked out repository; returns the image tag, or None if the build failed"""
+        logs = BuildLog(log_writer, cancel_event)
+        
+        try:
+            # In a monorepo only the app's directory is the build context
+            context_dir = os.path.join(repo_dir, app_path) if app_path else repo_dir
             
-            # Add MERN-specific environment variables
-            if framework == 'mern':
-                env_vars.update({
-                    'MONGODB_URI': environment.get('MONGODB_URI', 'mongodb://localhost:27017/app'),
-                    'JWT_SECRET': environment.get('JWT_SECRET', 'default-secret'),
-                    'NODE_ENV': 'production',
-                    'PORT': '8000',
-                    'REACT_APP_API_URL': f"https://{safe_project_name}.{self.deployment_domain}"
-                })
+            # Write appropriate Dockerfile if it doesn't exist
+            dockerfile_path = self._write_dockerfile(context_dir, framework, project_name)
+            logs.append(f"Created Dockerfile for {framework}" + (f" in {app_path}" if app_path else ""))
             
-            # Run the container
-            logs.append(f"Starting container {safe_project_name} on port {container_port}")
-            container = self.docker_client.containers.run(
-                image_tag,
-                name=safe_project_name,
-                detach=True,
-                environment=env_vars,
-                network=self.nginx_proxy_network,
-                ports={
-                    '8000/tcp': container_port
-                },
-                labels={
-                    'traefik.enable': 'true',
-                    f'traefik.http.routers.{safe_project_name}.rule': f'Host(`{safe_project_name}.{self.deployment_domain}`)',
-                    f'traefik.http.services.{safe_project_name}.loadbalancer.server.port': '8000'
-                }
-            )
+            context = BuildContext.from_directory(context_dir, framework)
+            return self._build_image(context, project_name, deployment_id, image_tag, cache_from, logs, project_id), "\n".join(logs)
             
-            logs.append(f"Container {safe_project_name} started successfully")
-            container_id = container.id
+        except BuildCancelled:
+            raise
             
+        except Exception as e:
+            error_msg = f"Error building image: {str(e)}"
+            logger.error(error_msg)
+            logs.append(error_msg)
+            return None, "\n".join(logs)
+            
+        finally:
             # Clean up
             try:
                 shutil.rmtree(repo_dir)
@@ -264,24 +553,40 @@ CMD ["bash", "-c", "echo 'Application running. Configure container as needed.' &
             except Exception as cleanup_error:
                 logger.error(f"Error cleaning up temporary files: {str(cleanup_error)}")
                 logs.append(f"Error cleaning up temporary files: {str(cleanup_error)}")
+    
+    def build_context(self, context, project_name, deployment_id, image_tag=None, cache_from=None, log_writer=None, cancel_event=None, project_id=None):
+        """Build an image from a ready-made context, such as a streamed source archive; returns the image tag, or None if the build failed"""
+        logs = BuildLog(log_writer, cancel_event)
+        
+        try:
+            return self._build_image(context, project_name, deployment_id, image_tag, cache_from, logs, project_id), "\n".join(logs)
             
-            return container_id, "\n".join(logs)
+        except BuildCancelled:
+            raise
             
         except Exception as e:
-            error_msg = f"Error building/running container: {str(e)}"
+            error_msg = f"Error building image: {str(e)}"
             logger.error(error_msg)
             logs.append(error_msg)
-            
-            # Clean up on error
-            try:
-                shutil.rmtree(repo_dir)
-            except FileNotFoundError:
-                pass
-            except Exception as cleanup_error:
-                logger.error(f"Error cleaning up temporary files: {str(cleanup_error)}")
-                logs.append(f"Error cleaning up temporary files: {str(cleanup_error)}")
-                
-            return container_id, "\n".join(logs)
+            context.close()
+            return None, "\n".join(logs)
+    
+    def run_image(self, image_tag, project_name, deployment_id, framework, environment=None, log_writer=None):
+        """Run a container from an already built image"""
+        logs = BuildLog(log_writer)
+        logs.append(f"Using image {image_tag}")
+        container_id = None
+        
+        try:
+            container_id = self._start_container(
+                image_tag, project_name, deployment_id, framework, environment, logs
+            )
+        except Exception as e:
+            error_msg = f"Error running container: {str(e)}"
+            logger.error(error_msg)
+            logs.append(error_msg)
+        
+        return container_id, "\n".join(logs)
     
     def stop_container(self, container_id):
         """Stop and remove a container"""
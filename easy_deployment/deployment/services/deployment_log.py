@@ -0,0 +1,95 @@
+import time
+import logging
+import threading
+from django.conf import settings
+from django.db import connection
+from django.db.models import TextField, Value
+from django.db.models.functions import Concat
+from ..models import Deployment
+
+logger = logging.getLogger(__name__)
+
+class DeploymentLogWriter:
+    """Appends log lines to a deployment record in bounded batches while work is in progress"""
+
+    def __init__(self, deployment, batch_lines=None, flush_interval=None):
+        self.deployment = deployment
+        self.batch_lines = batch_lines or settings.DEPLOYMENT_LOG_BATCH_LINES
+        self.flush_interval = flush_interval or settings.DEPLOYMENT_LOG_FLUSH_INTERVAL
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._last_flush = time.monotonic()
+
+    def write(self, line):
+        """Queue a line, flushing once the batch is full or the flush interval has passed"""
+        with self._lock:
+            self._pending.append(line)
+            if (len(self._pending) >= self.batch_lines or
+                    time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+            elif self._timer is None:
+                # Make sure a quiet build step does not hold buffered lines back
+                self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write all buffered lines to the deployment record"""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Flush remaining lines and reload the deployment's logs from the database"""
+        self.flush()
+        self.deployment.refresh_from_db(fields=['logs'])
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # Timer threads get their own database connection
+            connection.close()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+
+        chunk = "\n".join(self._pending) + "\n"
+        self._pending = []
+        try:
+            # Append in the database so concurrent readers always see a consistent prefix
+            Deployment.objects.filter(pk=self.deployment.pk).update(
+                logs=Concat('logs', Value(chunk), output_field=TextField())
+            )
+        except Exception as e:
+            logger.error(f"Error writing logs for deployment {self.deployment.pk}: {str(e)}")
+
+class BuildCancelled(Exception):
+    """Raised into a running build once its cancel event is set"""
+
+class BuildLog:
+    """Collects log lines for a build and forwards each one to an optional live writer"""
+
+    def __init__(self, writer=None, cancel_event=None):
+        self.lines = []
+        self.writer = writer
+        self.cancel_event = cancel_event
+        self.cancelled = False
+
+    def append(self, line):
+        # Every line of build output is a chance to stop a build that is no longer wanted; cleanup lines after that still log
+        if not self.cancelled and self.cancel_event is not None and self.cancel_event.is_set():
+            self.cancelled = True
+            raise BuildCancelled("Build cancelled")
+        self.lines.append(line)
+        if self.writer:
+            self.writer.write(line)
+
+    def __iter__(self):
+        return iter(self.lines)
@@ -0,0 +1,275 @@
+import os
+import select
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+from ..models import Deployment
+
+logger = logging.getLogger(__name__)
+
+# Statuses in which a deployment belongs to the worker holding its lease
+CLAIMED_STATUSES = ['building', 'deploying']
+
+# A deployment is superseded once a newer one of the same project and environment is in one of these
+SUPERSEDING_STATUSES = ['pending', 'building', 'deploying', 'deployed']
+
+def default_worker_id():
+    return settings.WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+def notify_queued(deployment_id):
+    """Wake listening workers about a newly queued deployment; a no-op off PostgreSQL"""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [settings.DEPLOYMENT_NOTIFY_CHANNEL, str(deployment_id)])
+
+class DeploymentQueue:
+    """Hands pending deployments to workers through leased claims, so any number of workers can drain the queue"""
+
+    def __init__(self, worker_id=None, lease_seconds=None):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds or settings.DEPLOYMENT_LEASE_SECONDS
+        self._cancel_events = {}
+
+    def _lease(self):
+        return timezone.now() + timedelta(seconds=self.lease_seconds)
+
+    def _claimable(self):
+        # Pending deployments not held back until a later time, plus ones whose worker stopped renewing its lease
+        now = timezone.now()
+        return (
+            Q(status='pending') & (Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now))
+            | Q(status__in=CLAIMED_STATUSES, lease_expires_at__lt=now)
+        )
+
+    def claim(self, limit=1, scheduler=None):
+        """Claim up to limit deployments, moving them to building under this worker's lease
+
+        Without a scheduler the oldest deployments are claimed. A scheduler is handed a window of
+        claimable deployments and each owner's running count, and returns the ids to claim in order.
+        """
+        if limit <= 0:
+            return []
+
+        self.skip_superseded()
+        
+        with transaction.atomic():
+            # Rows another worker is claiming right now are skipped rather than waited on
+            candidates = list(
+                Deployment.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(self._claimable())
+                .order_by('created_at')
+                .values('id', 'status', 'worker_id', 'created_at', 'environment__name',
+                        'project__owner_id', 'project__owner__username')[:settings.SCHEDULER_WINDOW if scheduler else limit]
+            )
+            if not candidates:
+                return []
+
+            if scheduler:
+                chosen = scheduler.choose(candidates, self.running_by_owner(), limit)
+            else:
+                chosen = [candidate['id'] for candidate in candidates]
+            if not chosen:
+                return []
+
+            lease = self._lease()
+            # Conditional as well, for databases without row locks
+            Deployment.objects.filter(self._claimable(), id__in=chosen).update(
+                status='building', worker_id=self.worker_id, lease_expires_at=lease
+            )
+
+        for candidate in candidates:
+            if candidate['id'] in chosen and candidate['status'] != 'pending':
+                logger.warning(f"Reclaimed deployment {candidate['id']} from {candidate['worker_id']}: "
+                               f"lease expired while {candidate['status']}")
+
+        claimed = Deployment.objects.filter(worker_id=self.worker_id, lease_expires_at=lease).select_related('project', 'environment')
+        return sorted(claimed, key=lambda deployment: chosen.index(deployment.id))
+
+    def _newer(self):
+        return Deployment.objects.filter(
+            project=OuterRef('project'),
+            environment=OuterRef('environment'),
+            id__gt=OuterRef('id'),
+            status__in=SUPERSEDING_STATUSES
+        )
+
+    def skip_superseded(self):
+        """Mark pending deployments that a newer one of the same project and environment supersedes as skipped"""
+        newest = self._newer().order_by('-id').values('id')[:1]
+        skipped = Deployment.objects.filter(Exists(self._newer()), status='pending').update(
+            status='skipped',
+            completed_at=timezone.now(),
+            logs=Concat(
+                'logs',
+                Value(f"[{datetime.now().isoformat()}] Skipped: superseded by deployment "),
+                Cast(Subquery(newest), TextField()),
+                Value("\n"),
+                output_field=TextField()
+            )
+        )
+        if skipped:
+            logger.info(f"Skipped {skipped} superseded pending deployments")
+        return skipped
+
+    def cancel_event(self, deployment_id):
+        """Event set once a build this worker holds is superseded and should stop"""
+        return self._cancel_events.setdefault(deployment_id, threading.Event())
+
+    def forget(self, deployment_id):
+        self._cancel_events.pop(deployment_id, None)
+
+    def running_by_owner(self):
+        """Deployments building or deploying under a live (or handed-off) claim, per project owner id"""
+        running = (
+            Deployment.objects.filter(status__in=CLAIMED_STATUSES)
+            .exclude(lease_expires_at__lt=timezone.now())
+            .values('project__owner_id')
+            .annotate(count=Count('id'))
+        )
+        return {row['project__owner_id']: row['count'] for row in running}
+
+    def claim_deployment(self, deployment_id, status='pending'):
+        """Claim one deployment in the given status if no live lease holds it; returns whether it was claimed"""
+        claimed = Deployment.objects.filter(
+            Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=timezone.now()),
+            id=deployment_id,
+            status=status
+        ).update(
+            status='building' if status == 'pending' else status,
+            worker_id=self.worker_id,
+            lease_expires_at=self._lease()
+        )
+        return bool(claimed)
+
+    def renew(self, deployment_ids):
+        """Extend this worker's leases; returns the ids whose lease was lost to another worker"""
+        deployment_ids = set(deployment_ids)
+        if not deployment_ids:
+            return set()
+
+        held = Deployment.objects.filter(
+            id__in=deployment_ids, worker_id=self.worker_id, status__in=CLAIMED_STATUSES
+        )
+        renewed = set(held.values_list('id', flat=True))
+        held.update(lease_expires_at=self._lease())
+
+        if settings.CANCEL_SUPERSEDED_BUILDS:
+            superseded = Deployment.objects.filter(Exists(self._newer()), id__in=renewed, status='building')
+            for deployment_id in superseded.values_list('id', flat=True):
+                if not self.cancel_event(deployment_id).is_set():
+                    logger.info(f"Deployment {deployment_id} was superseded, cancelling its build")
+                    self.cancel_event(deployment_id).set()
+
+        # Finished deployments drop out of the claimed statuses; only those taken over count as lost
+        lost = set(
+            Deployment.objects.filter(id__in=deployment_ids - renewed, status__in=CLAIMED_STATUSES)
+            .exclude(worker_id=self.worker_id)
+            .values_list('id', flat=True)
+        )
+        for deployment_id in lost:
+            logger.warning(f"Lost the lease on deployment {deployment_id} to another worker")
+        return lost
+
+    def release(self, deployment_id):
+        """Give up this worker's lease, leaving the deployment in its current status for the next owner"""
+        Deployment.objects.filter(id=deployment_id, worker_id=self.worker_id).update(lease_expires_at=None)
+
+    @contextmanager
+    def holding(self, deployment_id):
+        """Renew the lease on a deployment in the background while the block runs"""
+        stopped = threading.Event()
+
+        def keep_alive():
+            try:
+                while not stopped.wait(self.lease_seconds / 3):
+                    if self.renew([deployment_id]):
+                        # Another worker took over; stop building so the two do not race
+                        self.cancel_event(deployment_id).set()
+                        return
+            except Exception as e:
+                logger.error(f"Error renewing lease on deployment {deployment_id}: {str(e)}")
+            finally:
+                # The renewal thread gets its own database connection
+                connection.close()
+
+        thread = threading.Thread(target=keep_alive, name=f"lease-{deployment_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+class QueueListener:
+    """Blocks a worker until a deployment is queued, using PostgreSQL LISTEN/NOTIFY where available"""
+
+    def __init__(self, channel=None):
+        self.channel = channel or settings.DEPLOYMENT_NOTIFY_CHANNEL
+        self._connection = None
+        # Self-pipe so other threads, such as finishing builds, can wake the worker too
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+
+    def wake(self):
+        try:
+            os.write(self._wake_write, b'.')
+        except BlockingIOError:
+            # The pipe is full, so a wakeup is already pending
+            pass
+
+    def _listen(self):
+        if self._connection is None and connection.vendor == 'postgresql':
+            # A dedicated autocommit connection, so notifications arrive while the worker's own connection is busy
+            listener = connection.get_new_connection(connection.get_connection_params())
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                cursor.execute(f"LISTEN {connection.ops.quote_name(self.channel)}")
+            self._connection = listener
+            logger.info(f"Listening for queued deployments on {self.channel}")
+        return self._connection
+
+    def _drop_connection(self):
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+    def wait(self, timeout):
+        """Block until a notification, a wake() or the timeout; returns whether something woke the worker"""
+        listener = None
+        try:
+            listener = self._listen()
+        except Exception as e:
+            # Fall back to the timeout alone and try listening again next time
+            logger.error(f"Error listening for queued deployments: {str(e)}")
+
+        readable, _, _ = select.select([self._wake_read] + ([listener] if listener else []), [], [], timeout)
+
+        woken = False
+        if self._wake_read in readable:
+            try:
+                while os.read(self._wake_read, 1024):
+                    pass
+            except BlockingIOError:
+                pass
+            woken = True
+
+        if listener is not None and listener in readable:
+            try:
+                listener.poll()
+                woken = woken or bool(listener.notifies)
+                listener.notifies.clear()
+            except Exception as e:
+                logger.error(f"Lost the notification connection: {str(e)}")
+                self._drop_connection()
+        return woken
@@ -1,11 +1,16 @@
-import os
 import logging
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.conf import settings
+from django.utils import timezone
 from .github_service import GitHubService
+from .github_client import RateLimitExceeded
 from .container_service import ContainerService
-from ..models import Project, Deployment, Environment
+from .framework_detector import FrameworkDetector
+from .build_context import BuildContext
+from .local_project_service import LocalProjectService
+from .deployment_log import DeploymentLogWriter, BuildCancelled
+from ..models import Project, Deployment, Environment, ImageCache
 
 logger = logging.getLogger(__name__)
 
@@ -15,19 +20,28 @@ class DeploymentService:
         if github_account:
             self.github_service = GitHubService(github_account.access_token)
         self.container_service = ContainerService()
+        self.local_project_service = LocalProjectService()
     
     def create_deployment(self, project, branch=None, environment_name='production'):
         """Create a new deployment for a project"""
         if not branch:
             branch = project.branch
         
-        # Get GitHub repository details
-        repo_parts = project.repository_url.split('/')
-        owner, repo = repo_parts[-2], repo_parts[-1].replace('.git', '')
-        
-        # Get latest commit
-        commit_data = self.github_service.get_latest_commit(owner, repo, branch)
-        commit_hash = commit_data['sha']
+        if self._is_local(project):
+            # Uploaded projects have no commits; their content-addressed source revision plays that role
+            commit_hash = project.source_revision
+        else:
+            # Get GitHub repository details
+            owner, repo = self._repository_owner_and_name(project)
+            
+            # Get latest commit; under rate limiting the deployment is queued and the worker resolves it later,
+            # so the request never waits for the budget
+            try:
+                commit_data = self.github_service.get_latest_commit(owner, repo, branch, max_wait=0)
+                commit_hash = commit_data['sha']
+            except RateLimitExceeded as e:
+                logger.warning(f"Queueing deployment of {owner}/{repo} without a commit: {str(e)}")
+                commit_hash = ''
         
         # Get or create environment
         environment, _ = Environment.objects.get_or_create(
@@ -45,69 +59,316 @@ class DeploymentService:
         
         return deployment
     
-    def start_deployment_process(self, deployment):
-        """Start the deployment process"""
+    def _is_local(self, project):
+        return project.repository_url.startswith('local://')
+    
+    def _repository_owner_and_name(self, project):
+        """Split a project's GitHub repository URL into owner and repository name"""
+        repo_parts = project.repository_url.rstrip('/').split('/')
+        return repo_parts[-2], repo_parts[-1].replace('.git', '')
+    
+    def _build_cache_key(self, deployment, framework, app_path=''):
+        """Compute the image cache key for a deployment's commit and build configuration"""
+        project = deployment.project
+        build_inputs = {'project_id': project.id}
+        if app_path:
+            build_inputs['app_path'] = app_path
+        return self.container_service.build_cache_key(
+            deployment.commit_hash,
+            framework,
+            project.name,
+            # Scope images to the project so identical sources are never shared across owners
+            build_inputs=build_inputs
+        )
+    
+    def _detected_framework(self, deployment):
+        """Return the (framework, app_path) to build with, using the detection cached for this commit"""
+        project = deployment.project
+        detection = project.framework_detection or {}
+        if detection.get('commit') != deployment.commit_hash or 'framework' not in detection:
+            detection = {}
+        if project.framework_type != 'auto':
+            # A detected app directory still applies when the configured framework agrees with it
+            app_path = detection.get('app_path', '') if detection.get('framework') == project.framework_type else ''
+            return project.framework_type, app_path
+        if detection:
+            return detection['framework'], detection['app_path']
+        return 'auto', ''
+    
+    def _detect_framework(self, deployment, repo_dir):
+        """Detect the framework of a checked out commit and cache the result on the project"""
+        return self._store_detection(deployment, FrameworkDetector().detect_directory(repo_dir))
+    
+    def _detect_local_framework(self, deployment):
+        """Detect the framework of an uploaded revision from its manifest"""
+        return self._store_detection(deployment, self.local_project_service.detect_revision(deployment.commit_hash))
+    
+    def _store_detection(self, deployment, detection):
+        project = deployment.project
+        project.framework_detection = {'commit': deployment.commit_hash, **detection}
+        project.save(update_fields=['framework_detection'])
+        if len(detection['apps']) > 1:
+            apps = ", ".join(f"{app['path'] or '.'} ({app['framework']})" for app in detection['apps'])
+            deployment.logs += f"[{datetime.now().isoformat()}] Found apps: {apps}\n"
+        deployment.logs += (f"[{datetime.now().isoformat()}] Detected {detection['framework']}"
+                            f" in {detection['app_path'] or 'repository root'}\n")
+        deployment.save(update_fields=['logs'])
+        return detection['framework'], detection['app_path']
+    
+    def _get_cached_image(self, cache_key):
+        """Return the image cache entry for a key if its image is on this Docker host"""
+        cached_image = ImageCache.objects.filter(cache_key=cache_key).first()
+        if not cached_image:
+            return None
+        
+        if not self.container_service.image_exists(cached_image.image_tag):
+            # The entry is shared by every build host and may still be valid elsewhere; rebuilding here refreshes it
+            logger.info(f"Cached image {cached_image.image_tag} is not on this host, rebuilding")
+            return None
+        
+        return cached_image
+    
+    def _resolve_commit(self, deployment):
+        """Fill in the commit of a deployment that was queued while GitHub was rate limiting us"""
+        owner, repo = self._repository_owner_and_name(deployment.project)
+        commit_data = self.github_service.get_latest_commit(owner, repo, deployment.project.branch)
+        deployment.commit_hash = commit_data['sha']
+        deployment.save(update_fields=['commit_hash'])
+    
+    def start_deployment_process(self, deployment, cancel_event=None):
+        """Build and release a deployment in one go"""
+        built = self.build_deployment(deployment, cancel_event)
+        if built:
+            image_tag, framework = built
+            deployment = self.release_deployment(deployment, image_tag, framework)
+        return deployment
+    
+    def build_deployment(self, deployment, cancel_event=None):
+        """Build the image of a deployment; returns the image tag and framework, or None if nothing is ready to run
+
+        Setting cancel_event stops the build and marks the deployment skipped.
+        """
+        if not deployment.commit_hash and not self._is_local(deployment.project):
+            try:
+                self._resolve_commit(deployment)
+            except RateLimitExceeded as e:
+                # Put the deployment back in the queue, held back until the budget has had time to recover
+                logger.warning(f"Deployment {deployment.id} stays queued: {str(e)}")
+                deployment.status = 'pending'
+                deployment.lease_expires_at = timezone.now() + timedelta(seconds=settings.DEPLOYMENT_RATE_LIMIT_RETRY_DELAY)
+                deployment.save(update_fields=['status', 'lease_expires_at'])
+                return None
+        
+        log_writer = None
         try:
             deployment.status = 'building'
             deployment.save(update_fields=['status'])
             
-            # Clone repository
-            deployment.logs += f"[{datetime.now().isoformat()}] Cloning repository...\n"
-            deployment.save(update_fields=['logs'])
+            project = deployment.project
             
-            repo_dir = self.github_service.clone_repository(
-                deployment.project.repository_url,
-                deployment.project.branch
-            )
+            # Reuse an existing image when this exact source and build configuration was built before
+            framework, app_path = self._detected_framework(deployment)
+            cache_key = None
+            cached_image = None
+            if framework != 'auto':
+                cache_key = self._build_cache_key(deployment, framework, app_path)
+                cached_image = self._get_cached_image(cache_key)
+            
+            if cached_image:
+                deployment.logs += f"[{datetime.now().isoformat()}] Build cache hit ({cache_key[:12]}), skipping build...\n"
+                deployment.save(update_fields=['logs'])
+                
+                cached_image.mark_used()
+                image_tag = cached_image.image_tag
+                deployment.image_size = cached_image.image_size
+            elif self._is_local(project):
+                # Uploaded projects are streamed from the source store into the build context, never extracted
+                deployment.logs += f"[{datetime.now().isoformat()}] Streaming uploaded sources into build...\n"
+                deployment.save(update_fields=['logs'])
+                
+                if framework == 'auto':
+                    framework, app_path = self._detect_local_framework(deployment)
+                    cache_key = self._build_cache_key(deployment, framework, app_path)
+                context = BuildContext.from_manifest(
+                    self.local_project_service.store,
+                    deployment.commit_hash,
+                    framework,
+                    self.container_service.dockerfile_template(framework, project.name),
+                    subdirectory=app_path
+                )
+                
+                log_writer = DeploymentLogWriter(deployment)
+                image_tag, _ = self.container_service.build_context(
+                    context=context,
+                    project_name=project.name,
+                    project_id=project.id,
+                    deployment_id=deployment.id,
+                    image_tag=self.container_service.image_tag_for(project.name, cache_key),
+                    cache_from=[project.last_image_tag] if project.last_image_tag else None,
+                    log_writer=log_writer,
+                    cancel_event=cancel_event
+                )
+            elif settings.GITHUB_ARCHIVE_BUILDS and framework != 'auto':
+                # The framework is already known, so the source never needs to touch local disk
+                deployment.logs += f"[{datetime.now().isoformat()}] Streaming repository archive into build...\n"
+                deployment.save(update_fields=['logs'])
+                
+                owner, repo = self._repository_owner_and_name(project)
+                context = self.github_service.archive_build_context(
+                    owner,
+                    repo,
+                    deployment.commit_hash,
+                    framework,
+                    self.container_service.dockerfile_template(framework, project.name),
+                    app_path=app_path
+                )
+                
+                log_writer = DeploymentLogWriter(deployment)
+                image_tag, _ = self.container_service.build_context(
+                    context=context,
+                    project_name=project.name,
+                    project_id=project.id,
+                    deployment_id=deployment.id,
+                    image_tag=self.container_service.image_tag_for(project.name, cache_key),
+                    cache_from=[project.last_image_tag] if project.last_image_tag else None,
+                    log_writer=log_writer,
+                    cancel_event=cancel_event
+                )
+            else:
+                # Clone repository
+                deployment.logs += f"[{datetime.now().isoformat()}] Cloning repository...\n"
+                deployment.save(update_fields=['logs'])
+                
+                repo_dir = self.github_service.clone_repository(
+                    project.repository_url,
+                    project.branch,
+                    commit_hash=deployment.commit_hash
+                )
+                
+                # Detect framework if not specified
+                if framework == 'auto':
+                    framework, app_path = self._detect_framework(deployment, repo_dir)
+                    cache_key = self._build_cache_key(deployment, framework, app_path)
+                
+                # Environment variables are injected when the container starts rather than
+                # written into the build context, so one image serves every environment
+                
+                # Build container image
+                deployment.logs += f"[{datetime.now().isoformat()}] Building container...\n"
+                deployment.save(update_fields=['logs'])
+                
+                # Build output is streamed into the deployment log while the build runs
+                log_writer = DeploymentLogWriter(deployment)
+                image_tag, _ = self.container_service.build_directory(
+                    repo_dir=repo_dir,
+                    project_name=project.name,
+                    project_id=project.id,
+                    deployment_id=deployment.id,
+                    framework=framework,
+                    image_tag=self.container_service.image_tag_for(project.name, cache_key),
+                    cache_from=[project.last_image_tag] if project.last_image_tag else None,
+                    log_writer=log_writer,
+                    app_path=app_path,
+                    cancel_event=cancel_event
+                )
+            
+            if log_writer:
+                log_writer.close()
+            if not image_tag:
+                raise Exception("Image build failed")
+            
+            if not cached_image:
+                deployment.image_size = self.container_service.image_size(image_tag)
+                ImageCache.objects.update_or_create(
+                    cache_key=cache_key,
+                    defaults={
+                        'project': project,
+                        'image_tag': image_tag,
+                        'commit_hash': deployment.commit_hash,
+                        'framework_type': framework,
+                        'image_size': deployment.image_size,
+                        'last_used_at': timezone.now()
+                    }
+                )
             
-            # Detect framework if not specified
-            if deployment.project.framework_type == 'auto':
-                framework = self.github_service.detect_framework(repo_dir)
-                deployment.project.framework_type = framework
-                deployment.project.save(update_fields=['framework_type'])
-            
-            # Apply environment variables
-            if deployment.environment and deployment.environment.variables:
-                env_file_path = os.path.join(repo_dir, '.env')
-                with open(env_file_path, 'w') as env_file:
-                    for key, value in deployment.environment.variables.items():
-                        env_file.write(f"{key}={value}\n")
-            
-            # Build and deploy container
-            deployment.logs += f"[{datetime.now().isoformat()}] Building container...\n"
-            deployment.save(update_fields=['logs'])
-            
-            container_id, container_logs = self.container_service.build_and_run(
-                repo_dir=repo_dir,
-                project_name=deployment.project.name,
+            # Remember the last good image so the next build can use it as a layer cache source
+            project.last_image_tag = image_tag
+            project.save(update_fields=['last_image_tag'])
+            
+            # The image is ready; starting it is left to the release step
+            deployment.status = 'deploying'
+            deployment.save(update_fields=['status', 'image_size'])
+            return image_tag, framework
+            
+        except BuildCancelled:
+            if log_writer:
+                log_writer.close()
+            if not Deployment.objects.filter(id=deployment.id, worker_id=deployment.worker_id).exists():
+                # The lease was lost; the deployment is the new worker's to finish
+                logger.info(f"Stopped the build of deployment {deployment.id}, another worker took it over")
+                return None
+            logger.info(f"Cancelled the build of superseded deployment {deployment.id}")
+            deployment.logs += f"[{datetime.now().isoformat()}] Skipped: superseded by a newer deployment, build cancelled\n"
+            deployment.status = 'skipped'
+            deployment.completed_at = timezone.now()
+            deployment.save(update_fields=['logs', 'status', 'completed_at'])
+            return None
+            
+        except Exception as e:
+            self._mark_failed(deployment, e, log_writer)
+            return None
+    
+    def release_deployment(self, deployment, image_tag, framework):
+        """Start a container from a built image and publish the deployment"""
+        log_writer = None
+        try:
+            deployment.status = 'deploying'
+            deployment.save(update_fields=['status'])
+            
+            project = deployment.project
+            environment_variables = deployment.environment.variables if deployment.environment else {}
+            
+            log_writer = DeploymentLogWriter(deployment)
+            container_id, _ = self.container_service.run_image(
+                image_tag=image_tag,
+                project_name=project.name,
                 deployment_id=deployment.id,
-                framework=deployment.project.framework_type,
-                environment=deployment.environment.variables if deployment.environment else {}
+                framework=framework,
+                environment=environment_variables,
+                log_writer=log_writer
             )
-            
-            deployment.logs += container_logs
+            log_writer.close()
+            if not container_id:
+                raise Exception("Container failed to start")
             deployment.container_id = container_id
             
             # Generate a deployment URL
             deployment_domain = settings.DEPLOYMENT_DOMAIN
-            deployment_url = f"https://{deployment.project.name.lower()}-{deployment.id}.{deployment_domain}"
+            deployment_url = f"https://{project.name.lower()}-{deployment.id}.{deployment_domain}"
             
             # Update deployment record
             deployment.status = 'deployed'
             deployment.deployment_url = deployment_url
-            deployment.completed_at = datetime.now()
-            deployment.save()
+            deployment.completed_at = timezone.now()
+            # Only the fields this step owns, so a worker whose lease was lost cannot restore its claim
+            deployment.save(update_fields=['container_id', 'status', 'deployment_url', 'completed_at'])
             
             # Update project's last deployed timestamp
-            deployment.project.last_deployed = datetime.now()
-            deployment.project.save(update_fields=['last_deployed'])
+            project.last_deployed = datetime.now()
+            project.save(update_fields=['last_deployed'])
             
             return deployment
             
         except Exception as e:
-            logger.error(f"Deployment failed: {str(e)}")
-            deployment.logs += f"[{datetime.now().isoformat()}] ERROR: {str(e)}\n"
-            deployment.status = 'failed'
-            deployment.completed_at = datetime.now()
-            deployment.save()
-            return deployment
\ No newline at end of file
+            return self._mark_failed(deployment, e, log_writer)
+    
+    def _mark_failed(self, deployment, error, log_writer=None):
+        logger.error(f"Deployment failed: {str(error)}")
+        if log_writer:
+            # Pick up the lines the writer already stored so saving below does not drop them
+            log_writer.close()
+        deployment.logs += f"[{datetime.now().isoformat()}] ERROR: {str(error)}\n"
+        deployment.status = 'failed'
+        deployment.completed_at = timezone.now()
+        deployment.save(update_fields=['logs', 'status', 'completed_at'])
+        return deployment
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Directories that never hold an app root and are skipped during the walk
+SKIPPED_DIRECTORIES = {
+    '.git', 'node_modules', 'vendor', 'venv', '.venv', '__pycache__', 'dist', 'build',
+    'target', '.next', '.gradle', '.idea', '.vscode', 'coverage', 'bower_components',
+}
+
+# Manifests the rules may need to read; everything else is matched by name alone
+MANIFEST_FILES = {'package.json'}
+
+def _package_dependencies(directory):
+    package = directory.read_json('package.json')
+    dependencies = set(package.get('dependencies') or {})
+    return dependencies, dependencies | set(package.get('devDependencies') or {})
+
+def _php_rule(directory):
+    if 'composer.json' in directory.files or directory.has_suffix('.php'):
+        return 'lamp' if directory.has('public/.htaccess') else 'php'
+
+def _node_rule(directory):
+    if 'package.json' not in directory.files:
+        return None
+    dependencies, all_dependencies = _package_dependencies(directory)
+    if {'express', 'mongoose', 'react'} <= dependencies:
+        return 'mern'
+    if 'next' in all_dependencies:
+        return 'node-next'
+    if 'react' in all_dependencies:
+        return 'node-react'
+    if 'vue' in all_dependencies:
+        return 'node-vue'
+    return 'node'
+
+def _python_rule(directory):
+    if not {'requirements.txt', 'Pipfile'} & directory.files:
+        return None
+    if 'manage.py' in directory.files:
+        return 'python-django'
+    if directory.has_suffix('.py'):
+        return 'python-flask'
+
+def _java_rule(directory):
+    if 'pom.xml' in directory.files:
+        return 'java-maven'
+    if 'build.gradle' in directory.files or 'build.gradle.kts' in directory.files:
+        return 'java-gradle'
+
+def _static_rule(directory):
+    if 'index.html' in directory.files:
+        return 'static'
+
+# Evaluated in order for each directory; the first rule that matches wins
+RULES = [_php_rule, _node_rule, _python_rule, _java_rule, _static_rule]
+
+class _Directory:
+    """View of one directory of the file index, as seen by the rules"""
+
+    def __init__(self, path, files, index, read_file):
+        self.path = path
+        self.files = files
+        self._index = index
+        self._read_file = read_file
+
+    def has(self, relative_path):
+        return self._join(relative_path) in self._index
+
+    def has_suffix(self, suffix):
+        return any(name.endswith(suffix) for name in self.files)
+
+    def read_json(self, name):
+        try:
+            return json.loads(self._read_file(self._join(name)) or '{}')
+        except ValueError:
+            logger.warning(f"Could not parse {self._join(name)}")
+            return {}
+
+    def _join(self, name):
+        return f"{self.path}/{name}" if self.path else name
+
+class FrameworkDetector:
+    """Detects the framework and app directory of a source tree from a single bounded walk"""
+
+    def __init__(self, max_depth=3, max_files=20000):
+        self.max_depth = max_depth
+        self.max_files = max_files
+
+    def detect_directory(self, root):
+        """Walk a checked out tree once and detect its framework"""
+        started = time.monotonic()
+        paths = []
+        for current, dirnames, filenames in os.walk(root):
+            relative = os.path.relpath(current, root)
+            relative = '' if relative == '.' else relative.replace(os.sep, '/')
+            depth = self._depth(relative)
+
+            # Prune in place so skipped and too-deep directories are never listed
+            dirnames[:] = sorted(
+                name for name in dirnames
+                if name not in SKIPPED_DIRECTORIES and depth < self.max_depth
+            )
+            paths.extend(f"{relative}/{name}" if relative else name for name in filenames)
+            if len(paths) >= self.max_files:
+                logger.warning(f"Framework detection stopped after {len(paths)} files in {root}")
+                break
+
+        def read_file(path):
+            with open(os.path.join(root, path), encoding='utf-8', errors='replace') as f:
+                return f.read()
+
+        result = self.detect_paths(paths, read_file)
+        logger.info(f"Detected {result['framework']} at '{result['app_path'] or '.'}' "
+                    f"from {len(paths)} files in {(time.monotonic() - started) * 1000:.1f}ms")
+        return result
+
+    def _depth(self, path):
+        return path.count('/') + 1 if path else 0
+
+    def detect_paths(self, paths, read_file):
+        """Evaluate every rule against an index of relative file paths
+
+        Only manifests the matching rules ask for are read, each at most once.
+        Returns the primary app and every app found, shallowest first.
+        """
+        index = set()
+        directories = {}
+        for path in paths[:self.max_files]:
+            directory, _, name = path.rpartition('/')
+            parts = directory.split('/') if directory else []
+            if len(parts) > self.max_depth or set(parts) & SKIPPED_DIRECTORIES:
+                continue
+            index.add(path)
+            directories.setdefault(directory, set()).add(name)
+
+        contents = {}
+
+        def cached_read(path):
+            if path not in contents:
+                contents[path] = read_file(path) if path.rsplit('/', 1)[-1] in MANIFEST_FILES else None
+            return contents[path]
+
+        apps = []
+        for path in sorted(directories, key=lambda path: (self._depth(path), path)):
+            directory = _Directory(path, directories[path], index, cached_read)
+            for rule in RULES:
+                framework = rule(directory)
+                if framework:
+                    apps.append({'path': path, 'framework': framework, 'rule': RULES.index(rule)})
+                    break
+
+        if not apps:
+            return {'framework': 'unknown', 'app_path': '', 'apps': []}
+
+        # The root app wins; below it, plain static sites (often docs) only count when nothing else was found
+        static_rule = RULES.index(_static_rule)
+        primary = min(apps, key=lambda app: (
+            app['path'] != '', app['rule'] == static_rule, self._depth(app['path']), app['rule'], app['path']
+        ))
+        return {
+            'framework': primary['framework'],
+            'app_path': primary['path'],
+            'apps': [{'path': app['path'], 'framework': app['framework']} for app in apps],
+        }
@@ -0,0 +1,287 @@
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Size-bounded LRU of GitHub responses keyed by request, with their ETags for revalidation"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry['stored_at'] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, etag, data, links=None):
+        with self._lock:
+            self._entries[key] = {'etag': etag, 'data': data, 'links': links or {}, 'stored_at': time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def touch(self, key):
+        """Restart an entry's TTL after the server confirmed it is still current"""
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]['stored_at'] = time.monotonic()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+class RateLimitExceeded(Exception):
+    """Raised when a GitHub call cannot be scheduled within the allowed wait"""
+
+class TokenBudget:
+    """Rate limit state of one access token: GitHub's reported budget plus a local token bucket"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def reserve(self):
+        """Take a token if one is available; otherwise return how long to wait before trying again"""
+        with self.lock:
+            wait = self.blocked_until - time.time()
+            if wait > 0:
+                return wait
+            self._refill_locked()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.requests += 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def update(self, response):
+        """Record the budget GitHub reported for this token"""
+        headers = response.headers
+        with self.lock:
+            if 'X-RateLimit-Remaining' in headers:
+                self.limit = int(headers.get('X-RateLimit-Limit', self.limit or 0))
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+                self.reset_at = int(headers.get('X-RateLimit-Reset', 0))
+                # Spread what is left of the budget over the rest of the window instead of bursting through it
+                window = max(self.reset_at - time.time(), 1)
+                self.rate = max(self.remaining / window, 1 / window)
+                if self.remaining == 0:
+                    self.blocked_until = max(self.blocked_until, self.reset_at)
+
+    def back_off(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+            self.retries += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'limit': self.limit,
+                'remaining': self.remaining,
+                'reset_at': self.reset_at,
+                'requests': self.requests,
+                'retries': self.retries,
+                'throttled_seconds': round(self.throttled_seconds, 2),
+            }
+
+class GitHubClient:
+    """Process-wide GitHub API client with pooled keep-alive connections and conditional requests"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, api_base_url="https://api.github.com", pool_size=None, cache_size=None, cache_ttl=None):
+        self.api_base_url = api_base_url
+        pool_size = pool_size or settings.GITHUB_HTTP_POOL_SIZE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.cache = ResponseCache(
+            cache_size or settings.GITHUB_ETAG_CACHE_SIZE,
+            cache_ttl or settings.GITHUB_ETAG_CACHE_TTL
+        )
+        self.max_wait = settings.GITHUB_RATE_LIMIT_MAX_WAIT
+        self.max_retries = settings.GITHUB_RATE_LIMIT_MAX_RETRIES
+        self._budgets = {}
+        self._budgets_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """Return the client shared by every GitHubService in this process"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _token_id(self, headers):
+        # Responses and budgets are per user, so keys include the token (hashed, never stored)
+        return hashlib.sha256(headers.get('Authorization', '').encode('utf-8')).hexdigest()[:16]
+
+    def _cache_key(self, headers, url, params):
+        return (self._token_id(headers), url, tuple(sorted((params or {}).items())))
+
+    def _budget(self, headers):
+        token_id = self._token_id(headers)
+        with self._budgets_lock:
+            if token_id not in self._budgets:
+                # Start from GitHub's documented 5000 requests/hour until the first response reports the real budget
+                self._budgets[token_id] = TokenBudget(5000 / 3600, settings.GITHUB_RATE_LIMIT_BURST)
+            return self._budgets[token_id]
+
+    def _wait_for_budget(self, budget, started, max_wait):
+        """Block until the token bucket admits a call; callers queue here instead of failing"""
+        while True:
+            wait = budget.reserve()
+            if wait <= 0:
+                return
+            waited = time.monotonic() - started
+            if waited + wait > max_wait:
+                raise RateLimitExceeded(f"GitHub rate limit budget exhausted, next call possible in {wait:.0f}s")
+            with budget.lock:
+                budget.throttled_seconds += wait
+            time.sleep(wait)
+
+    def _retry_after(self, response, attempt):
+        """Seconds to back off for a rate-limited response, or None if it was not rate limited"""
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            return int(retry_after)
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            return max(int(response.headers.get('X-RateLimit-Reset', 0)) - time.time(), 1)
+        if 'rate limit' in response.text.lower():
+            # Secondary limits without Retry-After: exponential backoff with jitter
+            return min(60 * 2 ** attempt, self.max_wait) * random.uniform(0.8, 1.2)
+        return None
+
+    def _send(self, url, headers, params=None, stream=False, max_wait=None):
+        """Send a GET through the token's budget, backing off and retrying when GitHub throttles it
+
+        Waits for the budget at most max_wait seconds in total (GITHUB_RATE_LIMIT_MAX_WAIT by default),
+        and raises RateLimitExceeded rather than returning a throttled response.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        budget = self._budget(headers)
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_budget(budget, started, max_wait)
+            response = self.session.get(url, headers=headers, params=params, stream=stream)
+            budget.update(response)
+
+            retry_after = self._retry_after(response, attempt)
+            if retry_after is None:
+                return response
+            if attempt == self.max_retries:
+                raise RateLimitExceeded(f"GitHub rate limit still hit for {url} after {self.max_retries} retries")
+            logger.warning(f"GitHub rate limit hit for {url}, retrying in {retry_after:.0f}s")
+            budget.back_off(retry_after)
+
+    def request(self, path, headers, params=None, stream=False, max_wait=None):
+        """Send an uncached GET, e.g. for archive downloads"""
+        response = self._send(f"{self.api_base_url}{path}", headers, params=params, stream=stream, max_wait=max_wait)
+        response.raise_for_status()
+        return response
+
+    def get_json(self, path, headers, params=None, max_wait=None):
+        """GET a JSON resource, revalidating any cached copy with If-None-Match"""
+        data, _ = self.get_page(path, headers, params, max_wait=max_wait)
+        return data
+
+    def get_page(self, path, headers, params=None, max_wait=None):
+        """Like get_json, but also return the parsed Link header used for pagination"""
+        url = f"{self.api_base_url}{path}"
+        key = self._cache_key(headers, url, params)
+        cached = self.cache.get(key)
+
+        request_headers = dict(headers)
+        if cached:
+            request_headers['If-None-Match'] = cached['etag']
+
+        response = self._send(url, request_headers, params=params, max_wait=max_wait)
+
+        # A 304 costs nothing against the rate limit and carries no body to download
+        if cached and response.status_code == 304:
+            self.cache.touch(key)
+            self._record(hit=True)
+            return cached['data'], cached['links']
+
+        response.raise_for_status()
+        self._record(hit=False)
+        data = response.json()
+        links = {rel: link['url'] for rel, link in response.links.items()}
+        etag = response.headers.get('ETag')
+        if etag:
+            self.cache.set(key, etag, data, links)
+        return data, links
+
+    def _record(self, hit):
+        self.cache.record(hit)
+        stats = self.cache.stats()
+        if (stats['hits'] + stats['misses']) % 100 == 0:
+            logger.info(f"GitHub API cache: {stats['hits']} hits, {stats['misses']} misses "
+                        f"({stats['hit_ratio']:.0%}), {stats['entries']} entries, {stats['evictions']} evictions")
+            for token_id, budget in self.rate_limit_stats().items():
+                logger.info(f"GitHub rate limit for token {token_id[:8]}: {budget['remaining']}/{budget['limit']} left, "
+                            f"{budget['requests']} requests, {budget['retries']} retries, "
+                            f"{budget['throttled_seconds']}s throttled")
+
+    def stats(self):
+        return self.cache.stats()
+
+    def rate_limit_stats(self):
+        """Budget, request, retry and throttling metrics per access token (keyed by token hash)"""
+        with self._budgets_lock:
+            budgets = dict(self._budgets)
+        return {token_id: budget.stats() for token_id, budget in budgets.items()}
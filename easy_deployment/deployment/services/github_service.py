@@ -1,13 +1,29 @@
-import os
 import requests
 import tempfile
 import subprocess
-import json
+import time
+import base64
+import hashlib
+import threading
+from urllib.parse import parse_qs, urlparse
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.core.cache import cache
+from .build_context import BuildContext
+from .framework_detector import FrameworkDetector
+from .github_client import GitHubClient
+from .repository_cache import RepositoryCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# GitHub's maximum page size for repository listings
+REPOS_PER_PAGE = 100
+
+# Accounts whose repository list is being refreshed in the background by this process
+_refreshing_accounts = set()
+_refreshing_lock = threading.Lock()
+
 class GitHubService:
     def __init__(self, access_token):
         self.access_token = access_token
@@ -16,100 +32,181 @@ class GitHubService:
             'Authorization': f'token {access_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
+        self.client = GitHubClient.shared()
     
     def get_user_repos(self):
-        """Get repositories for the authenticated user"""
-        response = requests.get(f"{self.api_base_url}/user/repos", headers=self.headers)
-        response.raise_for_status()
-        return response.json()
+        """Get all repositories for the authenticated user, fetching the remaining pages concurrently"""
+        params = {'per_page': REPOS_PER_PAGE, 'sort': 'full_name'}
+        first_page, links = self.client.get_page("/user/repos", self.headers, params={**params, 'page': 1})
+        # Pages are shared with the response cache, so collect them into a list of our own
+        repos = list(first_page)
+        
+        last_page = self._page_number(links.get('last'))
+        if last_page:
+            # The last page is known from the first response, so the rest can be fetched in parallel
+            pages = range(2, last_page + 1)
+            with ThreadPoolExecutor(max_workers=settings.GITHUB_PAGE_FETCH_CONCURRENCY) as executor:
+                for page_repos in executor.map(
+                    lambda page: self.client.get_json("/user/repos", self.headers, params={**params, 'page': page}),
+                    pages
+                ):
+                    repos += page_repos
+        else:
+            # Without a "last" link, walk the "next" links one by one
+            page = 1
+            while links.get('next'):
+                page += 1
+                page_repos, links = self.client.get_page("/user/repos", self.headers, params={**params, 'page': page})
+                repos += page_repos
+        
+        return repos
+    
+    def _page_number(self, url):
+        if not url:
+            return None
+        page = parse_qs(urlparse(url).query).get('page')
+        return int(page[0]) if page else None
+    
+    def _repos_cache_key(self):
+        return f"github-repos:{hashlib.sha256(self.access_token.encode('utf-8')).hexdigest()[:32]}"
+    
+    def get_cached_user_repos(self):
+        """Return the account's repositories from cache, refreshing stale lists in the background"""
+        cache_key = self._repos_cache_key()
+        cached = cache.get(cache_key)
+        if cached is None:
+            return self._refresh_user_repos(cache_key)
+        
+        # Serve the stale list immediately and let one background refresh replace it
+        if time.time() - cached['fetched_at'] > settings.GITHUB_REPO_LIST_REFRESH:
+            with _refreshing_lock:
+                refresh = cache_key not in _refreshing_accounts
+                _refreshing_accounts.add(cache_key)
+            if refresh:
+                threading.Thread(target=self._background_refresh, args=(cache_key,), daemon=True).start()
+        
+        return cached['repos']
+    
+    def _refresh_user_repos(self, cache_key):
+        repos = self.get_user_repos()
+        cache.set(cache_key, {'repos': repos, 'fetched_at': time.time()}, settings.GITHUB_REPO_LIST_TTL)
+        return repos
+    
+    def _background_refresh(self, cache_key):
+        try:
+            self._refresh_user_repos(cache_key)
+        except Exception as e:
+            logger.error(f"Error refreshing repository list: {str(e)}")
+        finally:
+            with _refreshing_lock:
+                _refreshing_accounts.discard(cache_key)
     
     def get_repository_details(self, owner, repo):
         """Get details for a specific repository"""
-        response = requests.get(f"{self.api_base_url}/repos/{owner}/{repo}", headers=self.headers)
-        response.raise_for_status()
-        return response.json()
+        return self.client.get_json(f"/repos/{owner}/{repo}", self.headers)
     
     def get_branches(self, owner, repo):
         """Get branches for a repository"""
-        response = requests.get(f"{self.api_base_url}/repos/{owner}/{repo}/branches", 
-                               headers=self.headers)
-        response.raise_for_status()
-        return response.json()
-    
-    def get_latest_commit(self, owner, repo, branch):
-        """Get the latest commit for a branch"""
-        response = requests.get(f"{self.api_base_url}/repos/{owner}/{repo}/commits/{branch}", 
-                               headers=self.headers)
-        response.raise_for_status()
-        return response.json()
-    
-    def clone_repository(self, repo_url, branch='main'):
+        return self.client.get_json(f"/repos/{owner}/{repo}/branches", self.headers)
+    
+    def get_latest_commit(self, owner, repo, branch, max_wait=None):
+        """Get the latest commit for a branch, waiting at most max_wait seconds for the rate limit budget"""
+        return self.client.get_json(f"/repos/{owner}/{repo}/commits/{branch}", self.headers, max_wait=max_wait)
+    
+    def get_file_contents(self, owner, repo, path, ref):
+        """Get the decoded contents of a file at a ref, or None if it does not exist"""
+        try:
+            data = self.client.get_json(f"/repos/{owner}/{repo}/contents/{path}", self.headers, params={'ref': ref})
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+        return base64.b64decode(data['content']).decode('utf-8', errors='replace')
+    
+    def archive_build_context(self, owner, repo, commit_hash, framework, dockerfile, app_path=''):
+        """Stream the commit's tarball from GitHub straight into a build context, skipping the clone"""
+        dockerignore_path = f"{app_path}/.dockerignore" if app_path else '.dockerignore'
+        dockerignore = self.get_file_contents(owner, repo, dockerignore_path, commit_hash) or ''
+        response = self.client.request(f"/repos/{owner}/{repo}/tarball/{commit_hash}", self.headers, stream=True)
+        response.raw.decode_content = True
+        logger.info(f"Streaming archive of {owner}/{repo}@{commit_hash[:7]} into the build context")
+        return BuildContext.from_archive(response.raw, framework, dockerfile, dockerignore, subdirectory=app_path)
+    
+    def api_cache_stats(self):
+        """Hit/miss counters of the shared GitHub API response cache"""
+        return self.client.stats()
+    
+    def api_rate_limit_stats(self):
+        """Remaining budget and throttling metrics for every token used in this process"""
+        return self.client.rate_limit_stats()
+    
+    def clone_repository(self, repo_url, branch='main', commit_hash=None):
         """Clone a repository to a temporary directory"""
         try:
-            temp_dir = tempfile.mkdtemp()
             auth_url = repo_url.replace('https://', f'https://oauth2:{self.access_token}@')
             
-            result = subprocess.run(
-                ['git', 'clone', '--single-branch', '--branch', branch, auth_url, temp_dir],
-                capture_output=True,
-                text=True,
-                check=True
-            )
+            # Hot repositories are served from a local mirror with an incremental fetch
+            if commit_hash and settings.GIT_MIRROR_CACHE:
+                return RepositoryCache().checkout(repo_url, auth_url, branch, commit_hash)
+            
+            temp_dir = tempfile.mkdtemp()
+            started = time.monotonic()
+            
+            if commit_hash and settings.GIT_SHALLOW_CLONE:
+                self._fetch_commit(auth_url, repo_url, branch, commit_hash, temp_dir)
+            else:
+                result = subprocess.run(
+                    ['git', 'clone', '--single-branch', '--branch', branch, auth_url, temp_dir],
+                    capture_output=True,
+                    text=True,
+                    check=True
+                )
+                if commit_hash:
+                    self._git(temp_dir, 'checkout', '--quiet', '--detach', commit_hash)
             
-            logger.info(f"Cloned repository {repo_url} to {temp_dir}")
+            logger.info(f"Cloned repository {repo_url} to {temp_dir} in {time.monotonic() - started:.2f}s "
+                        f"({self._repository_size(temp_dir) / 1024:.0f} KiB transferred)")
             return temp_dir
         except subprocess.CalledProcessError as e:
             logger.error(f"Failed to clone repository: {e.stderr}")
             raise Exception(f"Failed to clone repository: {e.stderr}")
     
-    def detect_framework(self, repo_dir):
-        """Detect the framework used in the repository"""
-        files = os.listdir(repo_dir)
-        
-        # Check for LAMP stack
-        if 'composer.json' in files or any(f.endswith('.php') for f in files):
-            if os.path.exists(os.path.join(repo_dir, 'public', '.htaccess')):
-                return 'lamp'
-            return 'php'
-        
-        package_json_path = os.path.join(repo_dir, 'package.json')
-        
-        if 'package.json' in files:
-            with open(package_json_path, 'r') as f:
-                package_data = f.read()
-                dependencies = json.loads(package_data).get('dependencies', {})
-                
-                # Check for MERN stack
-                if ('express' in dependencies and 
-                    'mongoose' in dependencies and 
-                    'react' in dependencies):
-                    return 'mern'
-                
-                # Check for Node.js frameworks
-                if 'next' in package_data:
-                    return 'node-next'
-                elif 'react' in package_data:
-                    return 'node-react'
-                elif 'vue' in package_data:
-                    return 'node-vue'
-                else:
-                    return 'node'
+    def _git(self, repo_dir, *args):
+        return subprocess.run(['git', '-C', repo_dir, *args], capture_output=True, text=True, check=True)
+    
+    def _fetch_commit(self, auth_url, repo_url, branch, commit_hash, repo_dir):
+        """Fetch exactly one commit with depth 1 instead of the branch's full history"""
+        self._git(repo_dir, 'init', '--quiet')
+        self._git(repo_dir, 'remote', 'add', 'origin', auth_url)
         
-        # Check for Python frameworks
-        if 'requirements.txt' in files or 'Pipfile' in files:
-            if 'manage.py' in files:
-                return 'python-django'
-            elif 'app.py' in files or any(f.endswith('.py') for f in files):
-                return 'python-flask'
+        fetch_args = ['fetch', '--quiet', '--depth', '1', '--no-tags']
+        if settings.GIT_CLONE_FILTER:
+            # Partial clone: blobs outside the checkout are fetched lazily from the promisor remote
+            self._git(repo_dir, 'config', 'remote.origin.promisor', 'true')
+            self._git(repo_dir, 'config', 'remote.origin.partialclonefilter', settings.GIT_CLONE_FILTER)
+            fetch_args.append(f'--filter={settings.GIT_CLONE_FILTER}')
         
-        # Check for Java frameworks
-        if 'pom.xml' in files:
-            return 'java-maven'
-        elif 'build.gradle' in files:
-            return 'java-gradle'
+        try:
+            self._git(repo_dir, *fetch_args, 'origin', commit_hash)
+        except subprocess.CalledProcessError as e:
+            # Servers that refuse fetching by SHA still allow a shallow fetch of the branch tip
+            logger.warning(f"Fetching commit {commit_hash} directly failed, falling back to branch {branch}: {e.stderr}")
+            self._git(repo_dir, *fetch_args, 'origin', branch)
         
-        # Default to static if there's index.html
-        if 'index.html' in files:
-            return 'static'
+        self._git(repo_dir, 'checkout', '--quiet', '--detach', commit_hash)
         
-        return 'unknown'
\ No newline at end of file
+        # Do not leave the access token in the working copy's git config
+        self._git(repo_dir, 'remote', 'set-url', 'origin', repo_url)
+    
+    def _repository_size(self, repo_dir):
+        """Bytes of git objects stored in a clone, i.e. roughly what was transferred"""
+        try:
+            output = self._git(repo_dir, 'count-objects', '-v').stdout
+        except subprocess.CalledProcessError:
+            return 0
+        stats = dict(line.split(': ', 1) for line in output.splitlines() if ': ' in line)
+        return (int(stats.get('size', 0)) + int(stats.get('size-pack', 0))) * 1024
+    
+    def detect_framework(self, repo_dir):
+        """Detect the framework used in the repository"""
+        return FrameworkDetector().detect_directory(repo_dir)['framework']
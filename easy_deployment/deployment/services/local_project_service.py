@@ -1,70 +1,102 @@
 import os
-import shutil
+import time
+import logging
 import tempfile
 import zipfile
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from django.conf import settings
 from ..models import Project
-from .github_service import GitHubService
+from .framework_detector import FrameworkDetector
+from .source_store import SourceStore
+
+logger = logging.getLogger(__name__)
 
 class LocalProjectService:
     def __init__(self):
-        self.github_service = GitHubService(None)  # For framework detection
-    
+        self.detector = FrameworkDetector()
+        self.store = SourceStore()
+
+    def detect_revision(self, revision):
+        """Detect the framework of a stored revision from its manifest, reading only the manifests rules need"""
+        blobs = {entry['path']: entry['sha256'] for entry in self.store.manifest(revision)}
+
+        def read_file(path):
+            with self.store.open_blob(blobs[path]) as f:
+                return f.read().decode('utf-8', errors='replace')
+
+        return self.detector.detect_paths(list(blobs), read_file)
+
+    def inspect_archive(self, file):
+        """Validate an uploaded ZIP and detect its framework from the central directory alone"""
+        started = time.monotonic()
+        try:
+            with zipfile.ZipFile(file) as archive:
+                entries = [info for info in archive.infolist() if not info.is_dir()]
+                paths = [info.filename for info in entries]
+
+                # Reject archives that would escape the project directory or inflate beyond the limit
+                if any(path.startswith('/') or '..' in path.split('/') for path in paths):
+                    return {'valid': False, 'error': 'Archive contains unsafe paths', 'framework': 'unknown'}
+                uncompressed = sum(info.file_size for info in entries)
+                if uncompressed > settings.LOCAL_UPLOAD_MAX_UNCOMPRESSED_MB * 1024 * 1024:
+                    return {'valid': False, 'error': 'Archive is too large once extracted', 'framework': 'unknown'}
+
+                # Only the manifests the detection rules ask for are decompressed
+                detection = self.detector.detect_paths(
+                    paths, lambda path: archive.read(path).decode('utf-8', errors='replace')
+                )
+        except zipfile.BadZipFile:
+            return {'valid': False, 'error': 'Not a valid ZIP file', 'framework': 'unknown'}
+
+        logger.info(f"Inspected upload with {len(paths)} entries ({uncompressed / (1024 * 1024):.1f} MB) "
+                    f"in {(time.monotonic() - started) * 1000:.1f}ms: {detection['framework']}")
+        return {
+            'valid': True,
+            'framework': detection['framework'],
+            'app_path': detection['app_path'],
+            'detection': detection,
+            'entries': len(paths),
+            'uncompressed_size': uncompressed
+        }
+
     def handle_upload(self, file, user):
         """Handle uploaded project files"""
-        temp_dir = tempfile.mkdtemp()
+        result = self.inspect_archive(file)
+        if not result['valid']:
+            return result
+
+        # Copy the upload to disk chunk by chunk so memory stays flat regardless of its size
+        fd, zip_path = tempfile.mkstemp(suffix='.zip')
         try:
-            # Save zip file
-            path = default_storage.save(
-                f'tmp/projects/{file.name}',
-                ContentFile(file.read())
-            )
-            full_path = default_storage.path(path)
-            
-            # Extract zip file
-            with zipfile.ZipFile(full_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-            
-            # Clean up zip file
-            default_storage.delete(path)
-            
-            # Detect framework
-            framework = self.github_service.detect_framework(temp_dir)
-            
-            return {
-                'framework': framework,
-                'temp_dir': temp_dir,
-                'valid': True
-            }
-            
+            with os.fdopen(fd, 'wb') as destination:
+                file.seek(0)
+                for chunk in file.chunks():
+                    destination.write(chunk)
         except Exception as e:
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
+            os.remove(zip_path)
             raise Exception(f"Error processing upload: {str(e)}")
-    
-    def create_project(self, temp_dir, name, user, framework_type='auto'):
+
+        result['zip_path'] = zip_path
+        return result
+
+    def create_project(self, zip_path, name, user, framework_type='auto', detection=None):
         """Create a project from uploaded files"""
         try:
+            # Files are deduplicated into the source store; the revision doubles as the commit hash
+            revision = self.store.ingest_zip(zip_path)
+
             # Create project record
             project = Project.objects.create(
                 name=name,
                 owner=user,
                 repository_url='local://' + name,  # Special URL for local projects
-                framework_type=framework_type
+                framework_type=framework_type,
+                framework_detection={'commit': revision, **(detection or {})},
+                source_revision=revision
             )
-            
-            # Store files in a permanent location
-            project_dir = os.path.join('projects', str(project.id))
-            if not os.path.exists(project_dir):
-                os.makedirs(project_dir)
-            
-            # Copy files from temp directory
-            shutil.copytree(temp_dir, project_dir, dirs_exist_ok=True)
-            
+
             return project
-            
+
         finally:
-            # Clean up temp directory
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
+            # Clean up the uploaded archive
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
@@ -0,0 +1,145 @@
+import os
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import tarfile
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class RepositoryCache:
+    """Keeps one bare mirror per repository so deployments only fetch what changed since the last one"""
+
+    def __init__(self, cache_dir=None, max_size_mb=None):
+        self.cache_dir = cache_dir or settings.GIT_MIRROR_CACHE_DIR
+        self.max_size = (max_size_mb or settings.GIT_MIRROR_CACHE_MAX_MB) * 1024 * 1024
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _mirror_path(self, repo_url):
+        key = hashlib.sha256(repo_url.lower().rstrip('/').removesuffix('.git').encode('utf-8')).hexdigest()[:24]
+        return os.path.join(self.cache_dir, f"{key}.git")
+
+    @contextmanager
+    def _lock(self, mirror_path, shared=False, blocking=True):
+        """Hold a cross-process lock on a mirror; fetches and eviction are exclusive, exports shared"""
+        with open(f"{mirror_path}.lock", 'w') as lock_file:
+            flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            if not blocking:
+                flags |= fcntl.LOCK_NB
+            fcntl.flock(lock_file, flags)
+            try:
+                yield lock_file
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _git(self, mirror_path, *args):
+        return subprocess.run(['git', '--git-dir', mirror_path, *args], capture_output=True, text=True, check=True)
+
+    def _has_commit(self, mirror_path, commit_hash):
+        try:
+            self._git(mirror_path, 'cat-file', '-e', f"{commit_hash}^{{commit}}")
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    def checkout(self, repo_url, auth_url, branch, commit_hash):
+        """Bring the mirror up to date and export the commit's tree into a new temporary directory"""
+        mirror_path = self._mirror_path(repo_url)
+        started = time.monotonic()
+
+        with self._lock(mirror_path) as lock_file:
+            if not os.path.exists(mirror_path):
+                subprocess.run(['git', 'init', '--bare', '--quiet', mirror_path], capture_output=True, text=True, check=True)
+
+            if not self._has_commit(mirror_path, commit_hash):
+                # The token is passed per fetch and never stored in the mirror's config
+                self._git(mirror_path, 'fetch', '--quiet', '--no-tags', auth_url, f"+refs/heads/{branch}:refs/heads/{branch}")
+                if not self._has_commit(mirror_path, commit_hash):
+                    self._git(mirror_path, 'fetch', '--quiet', '--no-tags', auth_url, commit_hash)
+                fetched = True
+            else:
+                fetched = False
+
+            # The mirror's mtime doubles as its last-used time for eviction
+            os.utime(mirror_path)
+
+            # Downgrade on the same descriptor rather than unlocking, so no eviction can remove the mirror in between
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            fetch_seconds = time.monotonic() - started
+            temp_dir = tempfile.mkdtemp()
+            try:
+                self._export(mirror_path, commit_hash, temp_dir)
+            except Exception:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                raise
+
+        logger.info(f"Checked out {repo_url}@{commit_hash[:7]} from mirror cache "
+                    f"({'fetched' if fetched else 'no fetch needed'} in {fetch_seconds:.2f}s, "
+                    f"total {time.monotonic() - started:.2f}s)")
+
+        try:
+            self.evict(keep=mirror_path)
+        except Exception as e:
+            # The checkout already succeeded; a failed eviction is retried after the next one
+            logger.error(f"Error evicting repository mirrors: {str(e)}")
+        return temp_dir
+
+    def _export(self, mirror_path, commit_hash, target_dir):
+        """Stream `git archive` straight into the target directory"""
+        process = subprocess.Popen(
+            ['git', '--git-dir', mirror_path, 'archive', '--format=tar', commit_hash],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        with tarfile.open(fileobj=process.stdout, mode='r|') as archive:
+            archive.extractall(target_dir)
+        stderr = process.stderr.read().decode('utf-8', errors='replace')
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, 'git archive', stderr=stderr)
+
+    def _size(self, path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def evict(self, keep=None):
+        """Remove least recently used mirrors until the cache fits its size budget"""
+        last_used = {}
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.git'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                last_used[path] = os.path.getmtime(path)
+            except FileNotFoundError:
+                # Another process evicted it since the listing
+                continue
+        sizes = {path: self._size(path) for path in last_used}
+        total = sum(sizes.values())
+
+        for mirror_path in sorted(last_used, key=last_used.get):
+            if total <= self.max_size:
+                break
+            if mirror_path == keep:
+                continue
+            try:
+                # Mirrors that are being fetched or exported right now are skipped
+                with self._lock(mirror_path, blocking=False):
+                    shutil.rmtree(mirror_path)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                logger.error(f"Error evicting mirror {mirror_path}: {str(e)}")
+                continue
+            total -= sizes[mirror_path]
+            logger.info(f"Evicted repository mirror {mirror_path} ({sizes[mirror_path] / (1024 * 1024):.0f} MB)")
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import zipfile
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class SourceStore:
+    """Content-addressed store for uploaded sources: one blob per distinct file, one manifest per revision"""
+
+    def __init__(self, root=None):
+        self.root = str(root or settings.SOURCE_STORE_DIR)
+        self.blobs_dir = os.path.join(self.root, 'blobs')
+        self.manifests_dir = os.path.join(self.root, 'manifests')
+        self.tmp_dir = os.path.join(self.root, 'tmp')
+
+    def blob_path(self, digest):
+        return os.path.join(self.blobs_dir, digest[:2], digest[2:])
+
+    def manifest_path(self, revision):
+        return os.path.join(self.manifests_dir, f"{revision}.json")
+
+    def ingest_zip(self, zip_path):
+        """Store every file of an uploaded ZIP as a blob and return the revision id of its manifest"""
+        entries = []
+        stored = 0
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as source:
+                    digest, new = self._store_blob(source)
+                stored += new
+                entries.append({
+                    'path': info.filename,
+                    'sha256': digest,
+                    'size': info.file_size,
+                    # Unix permissions live in the high bits of external_attr when the ZIP was made on Unix
+                    'mode': (info.external_attr >> 16) & 0o7777 or 0o644,
+                })
+
+        entries.sort(key=lambda entry: entry['path'])
+        manifest = json.dumps({'entries': entries}, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        # Revisions are content-addressed too, so an identical upload maps to the same revision
+        revision = hashlib.sha256(manifest).hexdigest()[:40]
+        if not os.path.exists(self.manifest_path(revision)):
+            self._write_atomic(self.manifest_path(revision), manifest)
+
+        logger.info(f"Stored revision {revision[:12]}: {len(entries)} files, {stored} new blobs, "
+                    f"{len(entries) - stored} deduplicated")
+        return revision
+
+    def _store_blob(self, source):
+        """Stream a file into the store; returns its digest and whether it was new"""
+        digest = hashlib.sha256()
+        fd, temp_path = self._temp_file()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+            path = self.blob_path(digest.hexdigest())
+            if os.path.exists(path):
+                # Refresh the blob so a concurrent collection treats it as recently used
+                os.utime(path)
+                return digest.hexdigest(), False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Blobs are shared between revisions and must never be modified in place
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, path)
+            return digest.hexdigest(), True
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _write_atomic(self, path, data):
+        fd, temp_path = self._temp_file()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+
+    def _temp_file(self):
+        # The store's directories are created by its first write, not when a service merely opens it
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return tempfile.mkstemp(dir=self.tmp_dir)
+
+    def _revisions(self):
+        if not os.path.isdir(self.manifests_dir):
+            return []
+        return [name[:-len('.json')] for name in os.listdir(self.manifests_dir) if name.endswith('.json')]
+
+    def manifest(self, revision):
+        """Return the manifest entries of a revision"""
+        with open(self.manifest_path(revision)) as f:
+            return json.load(f)['entries']
+
+    def open_blob(self, digest):
+        return open(self.blob_path(digest), 'rb')
+
+    def read_file(self, revision, path):
+        """Return the contents of one file of a revision, or None if it is not there"""
+        for entry in self.manifest(revision):
+            if entry['path'] == path:
+                with self.open_blob(entry['sha256']) as f:
+                    return f.read().decode('utf-8', errors='replace')
+        return None
+
+    def materialize(self, revision, target_dir):
+        """Recreate a revision's tree, hardlinking blobs where possible instead of copying them"""
+        linked = 0
+        for entry in self.manifest(revision):
+            target = os.path.join(target_dir, entry['path'])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Linked files share the blob's inode and mode, so executables get their own copy
+            if not entry['mode'] & 0o111:
+                try:
+                    os.link(self.blob_path(entry['sha256']), target)
+                    linked += 1
+                    continue
+                except OSError:
+                    # Different filesystem or no hardlink support
+                    pass
+            shutil.copyfile(self.blob_path(entry['sha256']), target)
+            os.chmod(target, entry['mode'])
+        return linked
+
+    def usage(self):
+        """Logical size of all revisions versus bytes actually stored, and the resulting dedup ratio"""
+        revisions = self._revisions()
+        logical_bytes = 0
+        files = 0
+        for revision in revisions:
+            entries = self.manifest(revision)
+            files += len(entries)
+            logical_bytes += sum(entry['size'] for entry in entries)
+
+        blobs = 0
+        stored_bytes = 0
+        for current, _, names in os.walk(self.blobs_dir):
+            for name in names:
+                blobs += 1
+                stored_bytes += os.path.getsize(os.path.join(current, name))
+
+        return {
+            'revisions': len(revisions),
+            'files': files,
+            'blobs': blobs,
+            'logical_bytes': logical_bytes,
+            'stored_bytes': stored_bytes,
+            'dedup_ratio': logical_bytes / stored_bytes if stored_bytes else 1.0,
+        }
+
+    def collect_garbage(self, keep_revisions, min_age=3600):
+        """Delete manifests not in keep_revisions and every blob no remaining manifest references"""
+        keep_revisions = set(keep_revisions)
+        cutoff = time.time() - min_age
+        removed_revisions = 0
+        for revision in self._revisions():
+            path = self.manifest_path(revision)
+            # Young manifests may belong to an upload that is not attached to a project yet
+            if revision not in keep_revisions and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed_revisions += 1
+
+        referenced = set()
+        for revision in self._revisions():
+            referenced.update(entry['sha256'] for entry in self.manifest(revision))
+
+        removed_blobs = 0
+        freed_bytes = 0
+        for current, _, names in os.walk(self.blobs_dir):
+            for name in names:
+                digest = os.path.basename(current) + name
+                path = os.path.join(current, name)
+                # Young blobs may belong to an upload whose manifest is not written yet
+                if digest not in referenced and os.path.getmtime(path) < cutoff:
+                    freed_bytes += os.path.getsize(path)
+                    os.remove(path)
+                    removed_blobs += 1
+
+        return {'revisions': removed_revisions, 'blobs': removed_blobs, 'freed_bytes': freed_bytes}
@@ -0,0 +1,68 @@
+import hmac
+import hashlib
+import logging
+from datetime import datetime
+from django.db import transaction
+from ..models import Project, Deployment, Environment
+from ..tasks import build_deployment
+
+logger = logging.getLogger(__name__)
+
+class WebhookService:
+    """Turns GitHub push webhooks into queued deployments without calling the GitHub API"""
+
+    def __init__(self, secret):
+        self.secret = secret
+
+    def verify_signature(self, body, signature_header):
+        """Check the X-Hub-Signature-256 header against the raw request body"""
+        if not self.secret or not signature_header or not signature_header.startswith('sha256='):
+            return False
+        expected = hmac.new(self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(f"sha256={expected}", signature_header)
+
+    def handle_push(self, payload):
+        """Queue a deployment for every project tracking the pushed branch; returns the deployments"""
+        ref = payload.get('ref', '')
+        commit_hash = payload.get('after', '')
+
+        # Tag pushes and branch deletions have nothing to deploy
+        if not ref.startswith('refs/heads/') or payload.get('deleted') or not commit_hash.strip('0'):
+            return []
+
+        branch = ref.removeprefix('refs/heads/')
+        full_name = payload.get('repository', {}).get('full_name', '').lower()
+        projects = Project.objects.filter(repository_full_name=full_name, branch=branch)
+
+        return [self._enqueue(project, commit_hash) for project in projects]
+
+    def _enqueue(self, project, commit_hash, environment_name='production'):
+        environment, _ = Environment.objects.get_or_create(project=project, name=environment_name)
+
+        with transaction.atomic():
+            # Rapid pushes collapse into the deployment that is still waiting for a worker
+            deployment = (
+                Deployment.objects.select_for_update()
+                .filter(project=project, environment=environment, status='pending')
+                .order_by('-created_at')
+                .first()
+            )
+            if deployment:
+                superseded = deployment.commit_hash
+                deployment.commit_hash = commit_hash
+                deployment.logs += f"[{datetime.now().isoformat()}] Push webhook: {superseded[:7]} superseded by {commit_hash[:7]}\n"
+                deployment.save(update_fields=['commit_hash', 'logs'])
+                logger.info(f"Coalesced push {commit_hash[:7]} into pending deployment {deployment.id}")
+                return deployment
+
+            deployment = Deployment.objects.create(
+                project=project,
+                commit_hash=commit_hash,
+                status='pending',
+                environment=environment,
+                logs=f"[{datetime.now().isoformat()}] Queued by push webhook for {commit_hash[:7]}\n"
+            )
+            # Celery build workers only hear about a deployment through its task; send it once the row is visible
+            transaction.on_commit(lambda: build_deployment.delay(deployment.id))
+            logger.info(f"Queued deployment {deployment.id} for {project.name}@{commit_hash[:7]}")
+            return deployment
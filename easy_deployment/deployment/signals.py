@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Deployment
+from .services.deployment_queue import notify_queued
+
+@receiver(post_save, sender=Deployment)
+def deployment_queued(sender, instance, created, **kwargs):
+    """Notify waiting workers once a new deployment is committed, or a finished one frees its owner's slot"""
+    # Requeued deployments, e.g. rate limited ones, are not announced: their lease holds them back until it passes
+    if (created and instance.status == 'pending') or (not created and instance.status in ('deployed', 'failed', 'skipped')):
+        transaction.on_commit(lambda: notify_queued(instance.id))
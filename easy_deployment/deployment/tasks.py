@@ -0,0 +1,95 @@
+import logging
+from celery import shared_task
+from django.conf import settings
+from .models import Deployment, GithubAccount
+from .services.deployment_service import DeploymentService
+from .services.deployment_queue import DeploymentQueue
+from workers.image_gc import ImageGarbageCollector
+from workers.scheduler import FairScheduler
+
+logger = logging.getLogger(__name__)
+
+# One collector per worker process, so passes stay IMAGE_GC_INTERVAL apart
+_image_gc = None
+# One scheduler per worker process, so its stats cover every build task the process runs
+_scheduler = None
+
+def _deployment_service(deployment):
+    # Uploaded projects are deployed without a GitHub account
+    github_account = GithubAccount.objects.filter(user=deployment.project.owner).first()
+    return DeploymentService(github_account)
+
+def _fair_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairScheduler()
+    return _scheduler
+
+def _collect_images():
+    """Evict unused images on this build host once a pass is due"""
+    global _image_gc
+    try:
+        if _image_gc is None:
+            _image_gc = ImageGarbageCollector()
+        _image_gc.run_if_due()
+    except Exception as e:
+        logger.error(f"Image GC error: {str(e)}")
+
+@shared_task(bind=True, max_retries=None)
+def build_deployment(self, deployment_id):
+    """Build the pending deployment the fair scheduler ranks first and hand it to the runtime queue
+
+    Every queued deployment sends one task, but each task claims through the same FairScheduler as the
+    polling workers, so Celery builds follow the priority classes, owner shares and per-owner cap too.
+    """
+    queue = DeploymentQueue()
+    scheduler = _fair_scheduler()
+    # Polling workers, other tasks and duplicate deliveries race for the same deployments; a claim is never handed out twice
+    claimed = queue.claim(1, scheduler=scheduler)
+    if not claimed:
+        if Deployment.objects.filter(status='pending').exists():
+            if self.request.retries >= settings.SCHEDULER_OWNER_CAP_MAX_RETRIES:
+                logger.warning(f"Task for deployment {deployment_id} gave up after {self.request.retries} retries, "
+                               f"leaving the pending deployments to polling workers and later build tasks")
+                return
+            # What is left is held back by the per-owner cap; wait for one of those owners' deployments to finish
+            raise self.retry(countdown=settings.SCHEDULER_OWNER_CAP_RETRY_DELAY)
+        logger.info(f"Deployment {deployment_id} is not pending or already claimed, skipping")
+        return
+    logger.info(f"Scheduler: {scheduler.stats()}")
+    
+    deployment = claimed[0]
+    if deployment.id != deployment_id:
+        logger.info(f"Task for deployment {deployment_id} is building deployment {deployment.id}, which the scheduler ranks first")
+    deployment_id = deployment.id
+    try:
+        with queue.holding(deployment_id):
+            built = _deployment_service(deployment).build_deployment(deployment, queue.cancel_event(deployment_id))
+    finally:
+        queue.forget(deployment_id)
+    # Builds fill this host's disk, so this host evicts its own unused images
+    _collect_images()
+    
+    if deployment.status == 'pending':
+        # The commit could not be resolved under GitHub's rate limit yet
+        raise self.retry(countdown=settings.DEPLOYMENT_RATE_LIMIT_RETRY_DELAY)
+    if built:
+        # The runtime worker claims the deployment from here
+        queue.release(deployment_id)
+        image_tag, framework = built
+        release_deployment.delay(deployment_id, image_tag, framework)
+    
+    logger.info(f"Deployment {deployment_id} build finished with status: {deployment.status}")
+
+@shared_task
+def release_deployment(deployment_id, image_tag, framework):
+    """Start the container of a built deployment"""
+    queue = DeploymentQueue()
+    if not queue.claim_deployment(deployment_id, status='deploying'):
+        logger.info(f"Deployment {deployment_id} is not deploying or already claimed, skipping")
+        return
+    
+    deployment = Deployment.objects.select_related('project', 'environment').get(id=deployment_id)
+    with queue.holding(deployment_id):
+        deployment = _deployment_service(deployment).release_deployment(deployment, image_tag, framework)
+    logger.info(f"Deployment {deployment_id} completed with status: {deployment.status}")
@@ -1,3 +1,1406 @@
-from django.test import TestCase
+import os
+import hmac
+import requests
+import json
+import io
+import hashlib
+import tarfile
+import zipfile
+import shutil
+import tempfile
+import threading
+import subprocess
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+from celery.exceptions import Retry
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from easy_deployment.celery import app as celery_app
+from .models import Project, Deployment, Environment, ImageCache, github_full_name
+from .services.framework_detector import FrameworkDetector
+from .services.source_store import SourceStore
+from .services.build_context import BuildContext
+from .services.local_project_service import LocalProjectService
+from .services.deployment_log import DeploymentLogWriter, BuildLog, BuildCancelled
+from .services.deployment_queue import DeploymentQueue, QueueListener
+from .services.github_client import GitHubClient, RateLimitExceeded, TokenBudget
+from .services.github_service import GitHubService
+from .services.repository_cache import RepositoryCache
+from .services.container_service import ContainerService
+from .services.deployment_service import DeploymentService
+from . import tasks as deployment_tasks
+from .tasks import build_deployment, release_deployment
+from workers.scheduler import FairScheduler
+from workers.build_executor import BuildExecutor
+from workers.image_gc import ImageGarbageCollector
+
+TESTDATA_DIR = Path(__file__).resolve().parent / 'testdata'
+WEBHOOK_SECRET = 'test-webhook-secret'
+MB = 1024 * 1024
+
+def load_payload(name):
+    return (TESTDATA_DIR / name).read_bytes()
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None, headers=None, links=None, text=''):
+        self.status_code = status_code
+        self._data = data
+        self.headers = headers or {}
+        self.links = links or {}
+        self.text = text
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+class FakeGitHub:
+    """Serves paginated repository listings with ETags, answering 304 when the client's copy is current"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def get(self, url, headers=None, params=None, stream=False):
+        page = (params or {}).get('page', 1)
+        etag = f'"page-{page}"'
+        self.requests.append((page, headers.get('If-None-Match')))
+        if headers.get('If-None-Match') == etag:
+            return FakeResponse(304)
+        links = {'last': {'url': f"https://api.github.com/user/repos?page={len(self.pages)}"}} if len(self.pages) > 1 else {}
+        return FakeResponse(data=self.pages[page - 1], headers={'ETag': etag}, links=links)
+
+class FakeClock:
+    """Stands in for the time module; sleeping advances the clock instead of blocking"""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def sign(body, secret=WEBHOOK_SECRET):
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+class GithubFullNameTests(SimpleTestCase):
+    def test_normalizes_github_urls(self):
+        self.assertEqual(github_full_name('https://github.com/Octocat/Hello-World'), 'octocat/hello-world')
+        self.assertEqual(github_full_name('https://github.com/Octocat/Hello-World.git'), 'octocat/hello-world')
+        self.assertEqual(github_full_name('https://github.com/Octocat/Hello-World/'), 'octocat/hello-world')
+
+    def test_ignores_non_github_urls(self):
+        self.assertEqual(github_full_name('local://my-upload'), '')
+        self.assertEqual(github_full_name('https://gitlab.com/octocat/hello-world'), '')
+
+@override_settings(GITHUB_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class GithubWebhookTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='octocat', password='secret')
+        self.project = Project.objects.create(
+            name='hello-world',
+            repository_url='https://github.com/octocat/hello-world.git',
+            owner=self.user,
+            branch='main'
+        )
+
+    def post(self, body, event='push', signature=None):
+        return self.client.post(
+            reverse('github_webhook'),
+            data=body,
+            content_type='application/json',
+            HTTP_X_GITHUB_EVENT=event,
+            HTTP_X_HUB_SIGNATURE_256=signature if signature is not None else sign(body)
+        )
+
+    def test_push_queues_deployment_for_matching_project(self):
+        response = self.post(load_payload('github_push.json'))
+
+        self.assertEqual(response.status_code, 202)
+        deployment = Deployment.objects.get()
+        self.assertEqual(response.json()['deployments'], [deployment.id])
+        self.assertEqual(deployment.project, self.project)
+        self.assertEqual(deployment.commit_hash, '0d1a26e67d8f5eaf1f6ba5c57fc3c7d91ac0fd1c')
+        self.assertEqual(deployment.status, 'pending')
+        self.assertEqual(deployment.environment.name, 'production')
+
+    def test_rapid_pushes_coalesce_into_pending_deployment(self):
+        first = load_payload('github_push.json')
+        payload = json.loads(first)
+        payload['before'], payload['after'] = payload['after'], 'a3c1f0e5b2d94c7e8f6a1b0c9d8e7f6a5b4c3d2e'
+        second = json.dumps(payload).encode('utf-8')
+
+        self.post(first)
+        self.post(second)
+
+        deployment = Deployment.objects.get()
+        self.assertEqual(deployment.commit_hash, 'a3c1f0e5b2d94c7e8f6a1b0c9d8e7f6a5b4c3d2e')
+
+    def test_queued_deployment_sends_one_build_task(self):
+        payload = json.loads(load_payload('github_push.json'))
+        payload['after'] = 'a3c1f0e5b2d94c7e8f6a1b0c9d8e7f6a5b4c3d2e'
+
+        with mock.patch('deployment.services.webhook_service.build_deployment') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post(load_payload('github_push.json'))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post(json.dumps(payload).encode('utf-8'))
+
+        task.delay.assert_called_once_with(Deployment.objects.get().id)
+
+    def test_push_after_build_started_queues_new_deployment(self):
+        self.post(load_payload('github_push.json'))
+        Deployment.objects.update(status='building')
+
+        self.post(load_payload('github_push.json'))
+
+        self.assertEqual(Deployment.objects.count(), 2)
+        self.assertEqual(Deployment.objects.filter(status='pending').count(), 1)
+
+    def test_push_to_other_branch_is_ignored(self):
+        self.project.branch = 'develop'
+        self.project.save()
+
+        response = self.post(load_payload('github_push.json'))
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Deployment.objects.exists())
+
+    def test_tag_push_is_ignored(self):
+        self.post(load_payload('github_push_tag.json'))
+
+        self.assertFalse(Deployment.objects.exists())
+
+    def test_invalid_signature_is_rejected(self):
+        body = load_payload('github_push.json')
+
+        response = self.post(body, signature=sign(body, secret='wrong-secret'))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Deployment.objects.exists())
+
+    def test_missing_signature_is_rejected(self):
+        response = self.post(load_payload('github_push.json'), signature='')
+
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(GITHUB_WEBHOOK_SECRET='')
+    def test_unconfigured_secret_rejects_everything(self):
+        body = load_payload('github_push.json')
+
+        response = self.post(body, signature=sign(body, secret=''))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_ping_is_acknowledged(self):
+        response = self.post(load_payload('github_ping.json'), event='ping')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'pong'})
+
+class FrameworkDetectorTests(SimpleTestCase):
+    def detect(self, files):
+        reads = []
+
+        def read_file(path):
+            reads.append(path)
+            return files[path]
+
+        result = FrameworkDetector().detect_paths(list(files), read_file)
+        result['reads'] = reads
+        return result
+
+    def test_root_app_wins(self):
+        result = self.detect({
+            'requirements.txt': 'Django',
+            'manage.py': '',
+            'frontend/package.json': '{"dependencies": {"react": "18"}}',
+        })
+
+        self.assertEqual(result['framework'], 'python-django')
+        self.assertEqual(result['app_path'], '')
+
+    def test_finds_app_in_subdirectory(self):
+        result = self.detect({
+            'README.md': '',
+            'docs/index.html': '',
+            'apps/web/package.json': '{"dependencies": {"react": "18"}, "devDependencies": {"next": "14"}}',
+        })
+
+        self.assertEqual(result['framework'], 'node-next')
+        self.assertEqual(result['app_path'], 'apps/web')
+        self.assertEqual([app['path'] for app in result['apps']], ['docs', 'apps/web'])
+
+    def test_dependency_names_are_matched_exactly(self):
+        result = self.detect({'package.json': '{"dependencies": {"vue-next-helper": "1"}, "description": "not next"}'})
+
+        self.assertEqual(result['framework'], 'node')
+
+    def test_mern_requires_runtime_dependencies(self):
+        result = self.detect({'package.json': '{"dependencies": {"express": "4", "mongoose": "8", "react": "18"}}'})
+
+        self.assertEqual(result['framework'], 'mern')
+
+    def test_skipped_directories_are_never_read(self):
+        result = self.detect({
+            'index.html': '',
+            'node_modules/left-pad/package.json': '{}',
+        })
+
+        self.assertEqual(result['framework'], 'static')
+        self.assertEqual(result['reads'], [])
+
+    def test_unknown_tree(self):
+        self.assertEqual(self.detect({'README.md': ''})['framework'], 'unknown')
+
+class SourceStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.store = SourceStore(os.path.join(self.directory.name, 'store'))
+
+    def ingest(self, files):
+        zip_path = os.path.join(self.directory.name, 'upload.zip')
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            for name, content in files.items():
+                archive.writestr(name, content)
+        return self.store.ingest_zip(zip_path)
+
+    def test_identical_files_are_stored_once(self):
+        first = self.ingest({'app.py': 'v1', 'static/logo.svg': '<svg/>'})
+        second = self.ingest({'app.py': 'v2', 'static/logo.svg': '<svg/>'})
+
+        usage = self.store.usage()
+        self.assertNotEqual(first, second)
+        self.assertEqual(usage['files'], 4)
+        self.assertEqual(usage['blobs'], 3)
+        self.assertEqual(self.store.read_file(second, 'app.py'), 'v2')
+
+    def test_identical_upload_maps_to_same_revision(self):
+        files = {'index.html': '<h1>hi</h1>'}
+
+        self.assertEqual(self.ingest(files), self.ingest(files))
+
+    def test_garbage_collection_keeps_shared_blobs(self):
+        kept = self.ingest({'app.py': 'v1', 'shared.txt': 'shared'})
+        dropped = self.ingest({'app.py': 'v2', 'shared.txt': 'shared'})
+
+        removed = self.store.collect_garbage([kept], min_age=0)
+
+        self.assertEqual(removed['revisions'], 1)
+        self.assertEqual(removed['blobs'], 1)
+        self.assertFalse(os.path.exists(self.store.manifest_path(dropped)))
+        self.assertEqual(self.store.read_file(kept, 'shared.txt'), 'shared')
+
+    def test_directories_are_created_on_first_write(self):
+        self.assertFalse(os.path.exists(self.store.root))
+        self.assertEqual(self.store.usage()['revisions'], 0)
+        self.assertEqual(self.store.collect_garbage([], min_age=0)['revisions'], 0)
+
+        revision = self.ingest({'app.py': 'v1'})
+
+        self.assertTrue(os.path.exists(self.store.manifest_path(revision)))
+
+    def test_materialize_recreates_tree(self):
+        revision = self.ingest({'app.py': 'v1', 'src/util.py': 'pass'})
+        target = os.path.join(self.directory.name, 'tree')
+
+        self.store.materialize(revision, target)
+
+        with open(os.path.join(target, 'src', 'util.py')) as f:
+            self.assertEqual(f.read(), 'pass')
+
+class LocalUploadTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        store_override = override_settings(SOURCE_STORE_DIR=os.path.join(self.directory.name, 'store'))
+        store_override.enable()
+        self.addCleanup(store_override.disable)
+        self.service = LocalProjectService()
+
+    def archive(self, files, compression=zipfile.ZIP_STORED):
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w', compression=compression) as archive:
+            for name, content in files.items():
+                archive.writestr(name, content)
+        data.seek(0)
+        return data
+
+    def test_valid_archive_is_detected(self):
+        result = self.service.inspect_archive(self.archive({'requirements.txt': 'flask', 'app.py': ''}))
+
+        self.assertTrue(result['valid'])
+        self.assertEqual(result['framework'], 'python-flask')
+        self.assertEqual(result['entries'], 2)
+
+    def test_unsafe_paths_are_rejected(self):
+        for path in ['../escape.py', 'app/../../escape.py', '/etc/cron.d/escape']:
+            with self.subTest(path=path):
+                result = self.service.inspect_archive(self.archive({'app.py': '', path: ''}))
+
+                self.assertFalse(result['valid'])
+                self.assertEqual(result['error'], 'Archive contains unsafe paths')
+
+    @override_settings(LOCAL_UPLOAD_MAX_UNCOMPRESSED_MB=1)
+    def test_archive_too_large_once_extracted_is_rejected(self):
+        # Compresses to a few kilobytes, so only the sizes in the central directory give it away
+        archive = self.archive({'app.py': '', 'data.bin': b'\0' * (2 * MB)}, compression=zipfile.ZIP_DEFLATED)
+
+        result = self.service.inspect_archive(archive)
+
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['error'], 'Archive is too large once extracted')
+
+    def test_upload_is_copied_to_disk_unchanged(self):
+        data = self.archive({'index.html': '<h1>hi</h1>', 'assets/logo.bin': os.urandom(256 * 1024)}).getvalue()
+        upload = SimpleUploadedFile('site.zip', data, content_type='application/zip')
+
+        result = self.service.handle_upload(upload, user=None)
+        self.addCleanup(os.remove, result['zip_path'])
+
+        self.assertTrue(result['valid'])
+        with open(result['zip_path'], 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_rejected_upload_leaves_no_file(self):
+        upload = SimpleUploadedFile('site.zip', b'not a zip')
+
+        with mock.patch('deployment.services.local_project_service.tempfile.mkstemp') as mkstemp:
+            result = self.service.handle_upload(upload, user=None)
+
+        self.assertFalse(result['valid'])
+        mkstemp.assert_not_called()
+
+class BuildContextTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.source_dir = self.directory.name
+
+    def write(self, name, contents=''):
+        path = os.path.join(self.source_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(contents)
+
+    def names(self, context):
+        data = b''.join(context.payload()) if context.streaming else context.payload().read()
+        with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+            return sorted(member.name for member in archive.getmembers() if member.isfile())
+
+    def test_directory_context_drops_defaults_and_dockerignore_matches(self):
+        for name in ['Dockerfile', 'server.js', '.git/HEAD', '.env', 'api/.env.local',
+                     'node_modules/express/index.js', 'api/node_modules/pg/index.js', 'debug.log', 'important.log']:
+            self.write(name)
+        self.write('.dockerignore', '# logs\n*.log\n!important.log\n')
+
+        context = BuildContext.from_directory(self.source_dir, 'node-express')
+        self.addCleanup(context.close)
+
+        self.assertEqual(self.names(context), ['.dockerignore', 'Dockerfile', 'important.log', 'server.js'])
+
+    def test_archive_context_drops_files_under_ignored_directories(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+            for name in ['octocat-app-abc/app.py', 'octocat-app-abc/.venv/bin/python',
+                         'octocat-app-abc/pkg/__pycache__/mod.pyc', 'octocat-app-abc/secrets/key.pem']:
+                info = tarfile.TarInfo(name)
+                info.size = 2
+                tar.addfile(info, io.BytesIO(b'ok'))
+        archive.seek(0)
+
+        context = BuildContext.from_archive(archive, 'python-flask', 'FROM python:3.11', dockerignore='secrets\n')
+
+        self.assertEqual(self.names(context), ['Dockerfile', 'app.py'])
+
+    def stored_revision(self, files):
+        store = SourceStore(os.path.join(self.source_dir, 'store'))
+        zip_path = os.path.join(self.source_dir, 'upload.zip')
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            for name, content in files.items():
+                archive.writestr(name, content)
+        return store, store.ingest_zip(zip_path)
+
+    def files(self, context):
+        with tarfile.open(fileobj=io.BytesIO(b''.join(context.payload()))) as archive:
+            return {member.name: archive.extractfile(member).read().decode()
+                    for member in archive.getmembers() if member.isfile()}
+
+    def test_manifest_context_adds_generated_dockerfile(self):
+        store, revision = self.stored_revision({'app.py': 'print(1)', 'requirements.txt': 'flask'})
+
+        context = BuildContext.from_manifest(store, revision, 'python-flask', 'FROM python:3.11')
+
+        files = self.files(context)
+        self.assertEqual(sorted(files), ['Dockerfile', 'app.py', 'requirements.txt'])
+        self.assertEqual(files['Dockerfile'], 'FROM python:3.11')
+
+    def test_manifest_context_keeps_user_dockerfile(self):
+        store, revision = self.stored_revision({'Dockerfile': 'FROM node:20', 'server.js': ''})
+
+        context = BuildContext.from_manifest(store, revision, 'node-express', 'FROM node:18')
+
+        files = self.files(context)
+        self.assertEqual(sorted(files), ['Dockerfile', 'server.js'])
+        self.assertEqual(files['Dockerfile'], 'FROM node:20')
+
+    def test_manifest_context_is_rerooted_at_subdirectory(self):
+        store, revision = self.stored_revision({
+            'README.md': '',
+            'apps/api/app.py': '',
+            'apps/api/.dockerignore': 'fixtures\n',
+            'apps/api/fixtures/dump.json': '',
+            'apps/web/server.js': '',
+        })
+
+        context = BuildContext.from_manifest(store, revision, 'python-flask', 'FROM python:3.11', subdirectory='/apps/api/')
+
+        self.assertEqual(self.names(context), ['.dockerignore', 'Dockerfile', 'app.py'])
+
+    def test_manifest_context_applies_revision_dockerignore(self):
+        store, revision = self.stored_revision({
+            'app.py': '',
+            '.dockerignore': 'docs\n*.md\n!README.md\n',
+            'docs/guide.txt': '',
+            'CHANGELOG.md': '',
+            'README.md': '',
+            'app/__pycache__/app.cpython-311.pyc': '',
+        })
+
+        context = BuildContext.from_manifest(store, revision, 'python-flask', 'FROM python:3.11')
+
+        self.assertEqual(self.names(context), ['.dockerignore', 'Dockerfile', 'README.md', 'app.py'])
+
+@mock.patch('deployment.services.deployment_service.ContainerService')
+class DeployTaskTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='octocat', password='secret')
+        self.project = Project.objects.create(
+            name='upload',
+            repository_url='local://upload',
+            owner=self.user,
+            source_revision='3f786850e387550fdab836ed7e6dc881de23001b'
+        )
+        patcher = mock.patch('deployment.tasks._collect_images')
+        self.collect_images = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Each test builds its scheduler from its own settings
+        patcher = mock.patch('deployment.tasks._scheduler', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_deploy_queues_build_and_returns_immediately(self, container_service):
+        self.client.force_login(self.user)
+
+        with mock.patch('deployment.views.build_deployment') as task:
+            response = self.client.post(reverse('project-deploy', args=[self.project.id]))
+
+        self.assertEqual(response.status_code, 202)
+        deployment = Deployment.objects.get()
+        self.assertEqual(response.json()['id'], deployment.id)
+        self.assertEqual(deployment.status, 'pending')
+        task.delay.assert_called_once_with(deployment.id)
+
+    def test_build_hands_image_to_runtime_queue(self, container_service):
+        deployment = Deployment.objects.create(project=self.project, commit_hash=self.project.source_revision)
+
+        def build(deployment, cancel_event):
+            deployment.status = 'deploying'
+            return 'upload:abc', 'static'
+
+        with mock.patch('deployment.tasks.DeploymentService') as service, \
+                mock.patch('deployment.tasks.release_deployment') as release:
+            service.return_value.build_deployment.side_effect = build
+            build_deployment(deployment.id)
+
+        release.delay.assert_called_once_with(deployment.id, 'upload:abc', 'static')
+
+    def test_builds_and_releases_use_separate_queues(self, container_service):
+        router = celery_app.amqp.router
+
+        self.assertEqual(router.route({}, build_deployment.name)['queue'].name, 'build')
+        self.assertEqual(router.route({}, release_deployment.name)['queue'].name, 'runtime')
+
+    @override_settings(SCHEDULER_MAX_PER_OWNER=1, SCHEDULER_OWNER_CAP_RETRY_DELAY=15)
+    def test_build_retries_when_owner_is_at_cap(self, container_service):
+        Deployment.objects.create(project=self.project, commit_hash='abc', status='building')
+        deployment = Deployment.objects.create(project=self.project, commit_hash='def')
+
+        with mock.patch.object(build_deployment, 'retry', side_effect=Retry()) as retry, \
+                mock.patch('deployment.tasks.DeploymentService') as service:
+            with self.assertRaises(Retry):
+                build_deployment(deployment.id)
+
+        retry.assert_called_once_with(countdown=15)
+        service.assert_not_called()
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.status, 'pending')
+
+    @override_settings(SCHEDULER_MAX_PER_OWNER=1, SCHEDULER_OWNER_CAP_MAX_RETRIES=3)
+    def test_build_stops_retrying_owner_cap_after_max_retries(self, container_service):
+        Deployment.objects.create(project=self.project, commit_hash='abc', status='building')
+        deployment = Deployment.objects.create(project=self.project, commit_hash='def')
+
+        with mock.patch.object(build_deployment, 'retry') as retry, \
+                self.assertLogs('deployment.tasks', 'WARNING'):
+            build_deployment.apply(args=[deployment.id], retries=3).get()
+
+        retry.assert_not_called()
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.status, 'pending')
+
+    def test_build_tasks_share_one_scheduler(self, container_service):
+        first = Deployment.objects.create(project=self.project, commit_hash='abc')
+        second = Deployment.objects.create(project=self.project, commit_hash='def')
+
+        def build(deployment, cancel_event):
+            deployment.status = 'failed'
+            return None
+
+        with mock.patch('deployment.tasks.DeploymentService') as service:
+            service.return_value.build_deployment.side_effect = build
+            build_deployment(first.id)
+            build_deployment(second.id)
+
+        stats = deployment_tasks._scheduler.stats()
+        self.assertEqual(sum(stats[name]['claimed'] for name in stats), 2)
+
+    @override_settings(DEPLOYMENT_RATE_LIMIT_RETRY_DELAY=60)
+    def test_build_retries_while_rate_limited(self, container_service):
+        deployment = Deployment.objects.create(project=self.project, commit_hash='')
+
+        def build(deployment, cancel_event):
+            deployment.status = 'pending'
+            return None
+
+        with mock.patch.object(build_deployment, 'retry', side_effect=Retry()) as retry, \
+                mock.patch('deployment.tasks.DeploymentService') as service:
+            service.return_value.build_deployment.side_effect = build
+            with self.assertRaises(Retry):
+                build_deployment(deployment.id)
+
+        retry.assert_called_once_with(countdown=60)
+
+    def test_build_takes_the_deployment_the_scheduler_ranks_first(self, container_service):
+        preview = Deployment.objects.create(
+            project=self.project, commit_hash='abc', environment=Environment.objects.create(project=self.project, name='preview')
+        )
+        production = Deployment.objects.create(
+            project=self.project, commit_hash='def', environment=Environment.objects.create(project=self.project, name='production')
+        )
+        built = []
+
+        def build(deployment, cancel_event):
+            built.append(deployment.id)
+            deployment.status = 'deploying'
+            return 'upload:def', 'static'
+
+        with mock.patch('deployment.tasks.DeploymentService') as service, \
+                mock.patch('deployment.tasks.release_deployment') as release:
+            service.return_value.build_deployment.side_effect = build
+            build_deployment(preview.id)
+
+        self.assertEqual(built, [production.id])
+        release.delay.assert_called_once_with(production.id, 'upload:def', 'static')
+        preview.refresh_from_db()
+        self.assertEqual(preview.status, 'pending')
+
+    def test_build_skips_deployments_already_taken(self, container_service):
+        deployment = Deployment.objects.create(project=self.project, commit_hash='abc', status='building')
+
+        with mock.patch('deployment.tasks.DeploymentService') as service:
+            build_deployment(deployment.id)
+
+        service.assert_not_called()
+
+    def test_release_publishes_deployment(self, container_service):
+        deployment = Deployment.objects.create(project=self.project, commit_hash='abc', status='deploying')
+        container_service.return_value.run_image.return_value = ('container-id', '')
+
+        release_deployment(deployment.id, 'upload:abc', 'static')
+
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.status, 'deployed')
+        self.assertEqual(deployment.container_id, 'container-id')
+
+    def test_worker_that_lost_its_lease_keeps_off_the_new_claim(self, container_service):
+        deployment = Deployment.objects.create(project=self.project, commit_hash='abc', status='deploying', worker_id='worker-1')
+        lease = timezone.now() + timedelta(seconds=60)
+        Deployment.objects.filter(id=deployment.id).update(worker_id='worker-2', lease_expires_at=lease)
+        container_service.return_value.run_image.return_value = (None, '')
+
+        DeploymentService().release_deployment(deployment, 'upload:abc', 'static')
+
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.status, 'failed')
+        self.assertEqual(deployment.worker_id, 'worker-2')
+        self.assertEqual(deployment.lease_expires_at, lease)
+
+    def test_build_cancelled_after_lost_lease_is_left_to_new_worker(self, container_service):
+        deployment = Deployment.objects.create(project=self.project, commit_hash='abc', status='building', worker_id='worker-1')
+        Deployment.objects.filter(id=deployment.id).update(worker_id='worker-2')
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        with mock.patch.object(DeploymentService, '_detected_framework', side_effect=BuildCancelled()):
+            self.assertIsNone(DeploymentService().build_deployment(deployment, cancel_event))
+
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.status, 'building')
+        self.assertEqual(deployment.worker_id, 'worker-2')
+
+    def test_cancelled_build_is_skipped_without_touching_its_lease(self, container_service):
+        lease = timezone.now() + timedelta(seconds=60)
+        deployment = Deployment.objects.create(project=self.project, commit_hash='abc', status='building',
+                                               worker_id='worker-1', lease_expires_at=lease)
+        Deployment.objects.filter(id=deployment.id).update(lease_expires_at=lease + timedelta(seconds=20))
+
+        with mock.patch.object(DeploymentService, '_detected_framework', side_effect=BuildCancelled()):
+            DeploymentService().build_deployment(deployment)
+
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.status, 'skipped')
+        self.assertTrue(timezone.is_aware(deployment.completed_at))
+        self.assertEqual(deployment.lease_expires_at, lease + timedelta(seconds=20))
+
+class DeploymentQueueTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='octocat', password='secret')
+        self.project = Project.objects.create(name='hello-world', repository_url='https://github.com/octocat/hello-world', owner=user)
+        self.first = DeploymentQueue(worker_id='worker-1')
+        self.second = DeploymentQueue(worker_id='worker-2')
+
+    def deploy(self, **fields):
+        return Deployment.objects.create(project=self.project, commit_hash='abc', **fields)
+
+    def test_claim_moves_deployment_to_building(self):
+        deployment = self.deploy()
+
+        claimed = self.first.claim()
+
+        self.assertEqual(claimed, [deployment])
+        self.assertEqual(claimed[0].status, 'building')
+        self.assertEqual(claimed[0].worker_id, 'worker-1')
+        self.assertGreater(claimed[0].lease_expires_at, timezone.now())
+
+    def test_workers_never_claim_the_same_deployment(self):
+        deployments = [self.deploy() for _ in range(3)]
+
+        first = self.first.claim(limit=2)
+        second = self.second.claim(limit=2)
+
+        self.assertEqual(first, deployments[:2])
+        self.assertEqual(second, deployments[2:])
+        self.assertFalse(self.first.claim_deployment(deployments[2].id))
+
+    def test_expired_lease_is_reclaimed(self):
+        deployment = self.deploy(status='building', worker_id='worker-1', lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.second.claim(), [deployment])
+        self.assertEqual(self.first.renew([deployment.id]), {deployment.id})
+
+    @override_settings(DEPLOYMENT_RATE_LIMIT_RETRY_DELAY=60)
+    def test_rate_limited_deployment_is_held_back_until_retry_delay(self):
+        deployment = Deployment.objects.create(project=self.project, commit_hash='')
+        claimed = self.first.claim()[0]
+
+        with mock.patch('deployment.services.deployment_service.ContainerService'), \
+                mock.patch.object(DeploymentService, '_resolve_commit', side_effect=RateLimitExceeded('budget exhausted')), \
+                self.assertLogs('deployment.services.deployment_service', 'WARNING'):
+            self.assertIsNone(DeploymentService().build_deployment(claimed))
+
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.status, 'pending')
+        self.assertEqual(self.second.claim(), [])
+        self.assertFalse(self.second.claim_deployment(deployment.id))
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=61)):
+            self.assertEqual(self.second.claim(), [deployment])
+
+    def test_holding_cancels_build_when_lease_is_lost(self):
+        self.first.lease_seconds = 0.03
+
+        with mock.patch.object(self.first, 'renew', return_value={42}) as renew:
+            with self.first.holding(42):
+                cancelled = self.first.cancel_event(42).wait(5)
+
+        self.assertTrue(cancelled)
+        renew.assert_called_once_with([42])
+
+    def test_live_lease_is_left_alone(self):
+        self.deploy(status='building', worker_id='worker-1', lease_expires_at=timezone.now() + timedelta(seconds=60))
+
+        self.assertEqual(self.second.claim(), [])
+
+    def test_new_deployment_notifies_workers_on_commit(self):
+        with mock.patch('deployment.signals.notify_queued') as notify:
+            with self.captureOnCommitCallbacks(execute=True):
+                deployment = self.deploy()
+            deployment.status = 'pending'
+            deployment.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                deployment.status = 'deployed'
+                deployment.save()
+
+        self.assertEqual(notify.call_args_list, [mock.call(deployment.id)] * 2)
+
+    def test_listener_wakes_from_other_threads(self):
+        listener = QueueListener()
+
+        listener.wake()
+
+        self.assertTrue(listener.wait(5))
+        self.assertFalse(listener.wait(0))
+
+    def test_scheduler_picks_what_to_claim(self):
+        preview = Environment.objects.create(project=self.project, name='preview')
+        production = Environment.objects.create(project=self.project, name='production')
+        older = self.deploy(environment=preview)
+        newer = self.deploy(environment=production)
+
+        claimed = self.first.claim(limit=2, scheduler=FairScheduler(max_per_owner=1))
+
+        self.assertEqual(claimed, [newer])
+        self.assertEqual(self.first.running_by_owner(), {self.project.owner_id: 1})
+        self.assertEqual(self.second.claim(scheduler=FairScheduler(max_per_owner=1)), [])
+
+    def test_superseded_pending_deployments_are_skipped(self):
+        production = Environment.objects.create(project=self.project, name='production')
+        staging = Environment.objects.create(project=self.project, name='staging')
+        superseded = [self.deploy(environment=production) for _ in range(2)]
+        newest = self.deploy(environment=production)
+        other = self.deploy(environment=staging)
+
+        claimed = self.first.claim(limit=5)
+
+        self.assertEqual(claimed, [newest, other])
+        for deployment in superseded:
+            deployment.refresh_from_db()
+            self.assertEqual(deployment.status, 'skipped')
+            self.assertIn(f"superseded by deployment {newest.id}", deployment.logs)
+
+    @override_settings(CANCEL_SUPERSEDED_BUILDS=True)
+    def test_superseded_build_is_cancelled(self):
+        environment = Environment.objects.create(project=self.project, name='production')
+        building = self.deploy(environment=environment, status='building', worker_id='worker-1',
+                               lease_expires_at=timezone.now() + timedelta(seconds=60))
+        cancel_event = self.first.cancel_event(building.id)
+
+        self.first.renew([building.id])
+        self.assertFalse(cancel_event.is_set())
+
+        self.deploy(environment=environment)
+        self.first.renew([building.id])
+        self.assertTrue(cancel_event.is_set())
+
+    def test_renew_extends_lease(self):
+        deployment = self.deploy(status='building', worker_id='worker-1', lease_expires_at=timezone.now() + timedelta(seconds=1))
+
+        self.assertEqual(self.first.renew([deployment.id]), set())
+
+        deployment.refresh_from_db()
+        self.assertGreater(deployment.lease_expires_at, timezone.now() + timedelta(seconds=30))
+
+class FairSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.next_id = 0
+
+    def candidate(self, owner, environment='production', age=0):
+        self.next_id += 1
+        return {
+            'id': self.next_id,
+            'created_at': self.now - timedelta(seconds=age),
+            'environment__name': environment,
+            'project__owner_id': owner,
+            'project__owner__username': f"user-{owner}",
+        }
+
+    def test_production_runs_before_preview(self):
+        preview = self.candidate(1, 'preview', age=60)
+        production = self.candidate(2, 'production')
+
+        chosen = FairScheduler(aging_seconds=0).choose([preview, production], {}, limit=1)
+
+        self.assertEqual(chosen, [production['id']])
+
+    def test_long_waits_are_promoted(self):
+        preview = self.candidate(1, 'preview', age=1200)
+        production = self.candidate(2, 'production')
+
+        chosen = FairScheduler(aging_seconds=600).choose([preview, production], {}, limit=1)
+
+        self.assertEqual(chosen, [preview['id']])
+
+    def test_owners_share_slots_fairly(self):
+        burst = [self.candidate(1, age=100 - i) for i in range(5)]
+        other = self.candidate(2, age=1)
+
+        chosen = FairScheduler(max_per_owner=10).choose(burst + [other], {}, limit=2)
+
+        self.assertEqual(chosen, [burst[0]['id'], other['id']])
+
+    def test_weights_skew_the_share(self):
+        heavy = [self.candidate(1, age=100 - i) for i in range(3)]
+        light = [self.candidate(2, age=100 - i) for i in range(3)]
+
+        scheduler = FairScheduler(max_per_owner=10, owner_weights={'user-1': 2.0})
+        chosen = scheduler.choose(heavy + light, {1: 2, 2: 1}, limit=2)
+
+        self.assertEqual(chosen, [heavy[0]['id'], light[0]['id']])
+
+    def test_owner_cap_is_enforced(self):
+        capped = self.candidate(1, age=100)
+        other = self.candidate(2)
+
+        chosen = FairScheduler(max_per_owner=2).choose([capped, other], {1: 2}, limit=2)
+
+        self.assertEqual(chosen, [other['id']])
+
+    def test_stats_report_waits_per_class(self):
+        scheduler = FairScheduler(aging_seconds=0)
+        scheduler.choose([self.candidate(1, 'production', age=30), self.candidate(2, 'preview', age=5)], {}, limit=1)
+
+        stats = scheduler.stats()
+
+        self.assertEqual(stats['production']['claimed'], 1)
+        self.assertAlmostEqual(stats['production']['max_wait_seconds'], 30, delta=1)
+        self.assertEqual(stats['preview']['waiting'], 1)
+
+class BuildLogTests(SimpleTestCase):
+    def test_cancel_event_stops_build_once(self):
+        cancel_event = threading.Event()
+        logs = BuildLog(cancel_event=cancel_event)
+        logs.append('Step 1/3')
+
+        cancel_event.set()
+
+        with self.assertRaises(BuildCancelled):
+            logs.append('Step 2/3')
+        logs.append('Cleaned up temporary files')
+        self.assertEqual(list(logs), ['Step 1/3', 'Cleaned up temporary files'])
+
+class DeploymentLogWriterTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='octocat', password='secret')
+        project = Project.objects.create(name='hello-world', repository_url='https://github.com/octocat/hello-world', owner=user)
+        self.deployment = Deployment.objects.create(project=project, status='building', logs='')
+
+    def stored_logs(self):
+        return Deployment.objects.get(pk=self.deployment.pk).logs
+
+    def test_lines_are_buffered_until_the_batch_is_full(self):
+        writer = DeploymentLogWriter(self.deployment, batch_lines=3, flush_interval=60)
+        self.addCleanup(writer.flush)
+
+        writer.write('Step 1/3')
+        writer.write('Step 2/3')
+        self.assertEqual(self.stored_logs(), '')
+
+        writer.write('Step 3/3')
+        self.assertEqual(self.stored_logs(), 'Step 1/3\nStep 2/3\nStep 3/3\n')
+
+    def test_line_after_the_flush_interval_flushes(self):
+        writer = DeploymentLogWriter(self.deployment, batch_lines=50, flush_interval=5)
+
+        with mock.patch('deployment.services.deployment_log.time.monotonic', return_value=writer._last_flush + 10):
+            writer.write('Step 1/3')
+
+        self.assertEqual(self.stored_logs(), 'Step 1/3\n')
+
+    def test_close_flushes_and_reloads_logs(self):
+        writer = DeploymentLogWriter(self.deployment, batch_lines=50, flush_interval=60)
+        writer.write('Step 1/3')
+
+        writer.close()
+
+        self.assertEqual(self.stored_logs(), 'Step 1/3\n')
+        self.assertEqual(self.deployment.logs, 'Step 1/3\n')
+
+class RepositoryCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.origin = os.path.join(self.directory.name, 'origin')
+        self.git('init', '--quiet', '--initial-branch=main', self.origin)
+        self.cache = RepositoryCache(cache_dir=os.path.join(self.directory.name, 'mirrors'), max_size_mb=100)
+
+    def git(self, *args):
+        return subprocess.run(
+            ['git', '-c', 'user.name=Octocat', '-c', 'user.email=octocat@example.com', *args],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    def commit(self, files):
+        for name, content in files.items():
+            with open(os.path.join(self.origin, name), 'w') as f:
+                f.write(content)
+        self.git('-C', self.origin, 'add', '.')
+        self.git('-C', self.origin, 'commit', '--quiet', '-m', 'update')
+        return self.git('-C', self.origin, 'rev-parse', 'HEAD')
+
+    def checkout(self, commit_hash):
+        url = f"file://{self.origin}"
+        temp_dir = self.cache.checkout(url, url, 'main', commit_hash)
+        self.addCleanup(shutil.rmtree, temp_dir, True)
+        return temp_dir
+
+    def read(self, temp_dir, name):
+        with open(os.path.join(temp_dir, name)) as f:
+            return f.read()
+
+    def test_checkout_exports_the_requested_commit(self):
+        first = self.commit({'app.py': 'v1'})
+        second = self.commit({'app.py': 'v2'})
+
+        self.assertEqual(self.read(self.checkout(second), 'app.py'), 'v2')
+        self.assertEqual(self.read(self.checkout(first), 'app.py'), 'v1')
+
+    def test_cached_commit_is_exported_without_fetching(self):
+        commit_hash = self.commit({'app.py': 'v1'})
+        self.checkout(commit_hash)
+
+        with mock.patch.object(self.cache, '_git', wraps=self.cache._git) as git:
+            self.checkout(commit_hash)
+
+        self.assertNotIn('fetch', [call.args[1] for call in git.call_args_list])
+
+    def test_mirror_stays_locked_from_fetch_through_export(self):
+        commit_hash = self.commit({'app.py': 'v1'})
+        mirror_path = self.cache._mirror_path(f"file://{self.origin}")
+        evictable = []
+
+        def probe(original):
+            def probed(*args):
+                try:
+                    with self.cache._lock(mirror_path, blocking=False):
+                        evictable.append(True)
+                except BlockingIOError:
+                    evictable.append(False)
+                return original(*args)
+            return probed
+
+        # The export directory is created between the fetch and the export
+        with mock.patch('deployment.services.repository_cache.tempfile.mkdtemp', side_effect=probe(tempfile.mkdtemp)), \
+                mock.patch.object(self.cache, '_export', side_effect=probe(self.cache._export)):
+            self.checkout(commit_hash)
+
+        self.assertEqual(evictable, [False, False])
+
+    def test_eviction_keeps_the_current_mirror(self):
+        self.checkout(self.commit({'app.py': 'v1'}))
+        stale = os.path.join(self.cache.cache_dir, 'stale.git')
+        os.makedirs(stale)
+        with open(os.path.join(stale, 'pack'), 'w') as f:
+            f.write('x' * 1024)
+        os.utime(stale, (0, 0))
+        self.cache.max_size = 0
+
+        self.cache.evict(keep=self.cache._mirror_path(f"file://{self.origin}"))
+
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(self.cache._mirror_path(f"file://{self.origin}")))
+
+    def test_eviction_skips_mirrors_removed_meanwhile(self):
+        self.cache.max_size = 0
+
+        with mock.patch('deployment.services.repository_cache.os.listdir', return_value=['gone.git']):
+            self.cache.evict()
+
+class GitHubClientCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.github = FakeGitHub([{'login': 'octocat'}])
+        self.client = GitHubClient()
+        self.client.session = self.github
+
+    def test_unchanged_resource_is_revalidated_and_served_from_cache(self):
+        first = self.client.get_json('/user', {'Authorization': 'token one'})
+        second = self.client.get_json('/user', {'Authorization': 'token one'})
+
+        self.assertEqual(second, first)
+        self.assertEqual(self.github.requests, [(1, None), (1, '"page-1"')])
+        self.assertEqual((self.client.stats()['hits'], self.client.stats()['misses']), (1, 1))
+
+    def test_cached_responses_are_not_shared_between_tokens(self):
+        self.client.get_json('/user', {'Authorization': 'token one'})
+        self.client.get_json('/user', {'Authorization': 'token two'})
+
+        self.assertEqual(self.github.requests, [(1, None), (1, None)])
+
+class GitHubRateLimitTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('deployment.services.github_client.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucket_throttles_once_burst_is_spent(self):
+        budget = TokenBudget(rate=2, burst=2)
+
+        self.assertEqual([budget.reserve(), budget.reserve()], [0.0, 0.0])
+        self.assertEqual(budget.reserve(), 0.5)
+        self.clock.sleep(0.5)
+        self.assertEqual(budget.reserve(), 0.0)
+
+    def test_exhausted_budget_blocks_until_reset(self):
+        budget = TokenBudget(rate=2, burst=2)
+
+        budget.update(FakeResponse(headers={
+            'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(self.clock.now) + 120)
+        }))
+
+        self.assertEqual(budget.remaining, 0)
+        self.assertEqual(budget.reserve(), 120)
+
+    def github_client(self, *responses):
+        client = GitHubClient()
+        client.session = mock.Mock()
+        client.session.get.side_effect = list(responses)
+        return client
+
+    def test_retry_after_is_honoured_before_retrying(self):
+        client = self.github_client(
+            FakeResponse(429, headers={'Retry-After': '7'}),
+            FakeResponse(data={'login': 'octocat'}),
+        )
+
+        with self.assertLogs('deployment.services.github_client', 'WARNING'):
+            response = client.request('/user', {'Authorization': 'token one'})
+
+        self.assertEqual(response.json(), {'login': 'octocat'})
+        self.assertEqual(self.clock.sleeps, [7])
+        self.assertEqual(client.rate_limit_stats().popitem()[1]['retries'], 1)
+
+    def test_wait_beyond_max_wait_fails_instead_of_blocking(self):
+        client = self.github_client(FakeResponse(429, headers={'Retry-After': '600'}))
+        client.max_wait = 300
+
+        with self.assertRaises(RateLimitExceeded), self.assertLogs('deployment.services.github_client', 'WARNING'):
+            client.request('/user', {'Authorization': 'token one'})
+        self.assertEqual(self.clock.sleeps, [])
+
+    @override_settings(GITHUB_RATE_LIMIT_MAX_RETRIES=3)
+    def test_exhausted_retries_raise_rate_limit_exceeded(self):
+        client = self.github_client(*[FakeResponse(429, headers={'Retry-After': '30'}) for _ in range(4)])
+
+        with self.assertRaises(RateLimitExceeded), self.assertLogs('deployment.services.github_client', 'WARNING'):
+            client.get_json('/repos/octocat/app/commits/main', {'Authorization': 'token one'})
+        self.assertEqual(self.clock.sleeps, [30, 30, 30])
+
+    def test_zero_wait_budget_never_sleeps(self):
+        client = self.github_client(FakeResponse(429, headers={'Retry-After': '30'}))
+
+        with self.assertRaises(RateLimitExceeded), self.assertLogs('deployment.services.github_client', 'WARNING'):
+            client.get_json('/repos/octocat/app/commits/main', {'Authorization': 'token one'}, max_wait=0)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_rate_limited_deploy_is_queued_without_a_commit(self):
+        client = self.github_client(FakeResponse(429, headers={'Retry-After': '30'}))
+        project = Project(name='app', repository_url='https://github.com/octocat/app', branch='main')
+
+        with mock.patch.object(GitHubClient, 'shared', return_value=client), \
+                mock.patch('deployment.services.deployment_service.ContainerService'), \
+                mock.patch('deployment.services.deployment_service.Environment') as environment, \
+                mock.patch('deployment.services.deployment_service.Deployment') as deployment, \
+                self.assertLogs('deployment.services', 'WARNING'):
+            environment.objects.get_or_create.return_value = (mock.Mock(), True)
+            DeploymentService(mock.Mock(access_token='token')).create_deployment(project)
+
+        self.assertEqual(deployment.objects.create.call_args.kwargs['commit_hash'], '')
+        self.assertEqual(self.clock.sleeps, [])
+
+class GitHubRepositoryListTests(SimpleTestCase):
+    def setUp(self):
+        self.github = FakeGitHub([[{'full_name': f"octocat/repo-{page}-{i}"} for i in range(3)] for page in range(3)])
+        client = GitHubClient()
+        client.session = self.github
+        patcher = mock.patch.object(GitHubClient, 'shared', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_revalidated_pages_do_not_grow_the_list(self):
+        service = GitHubService('token')
+
+        first = service.get_user_repos()
+        second = service.get_user_repos()
+        third = service.get_user_repos()
+
+        self.assertEqual(len(first), 9)
+        self.assertEqual(second, first)
+        self.assertEqual(third, first)
+        # The repeat listings were answered with 304s from the cached pages
+        self.assertEqual(sorted(etag for _, etag in self.github.requests[3:]), sorted(['"page-1"', '"page-2"', '"page-3"'] * 2))
+
+class BuildExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = BuildExecutor(max_concurrency=2, cpu_budget=4, memory_budget_mb=4096)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_slot_is_free_when_done_callback_runs(self):
+        seen = []
+        done = threading.Event()
+
+        def on_done(_):
+            seen.append((self.executor.free_slots(), self.executor.tracked_ids()))
+            done.set()
+
+        self.executor.submit(1, lambda deployment_id: None).add_done_callback(on_done)
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(seen, [(2, set())])
+
+    def blocking_build(self, started, release):
+        def build(deployment_id):
+            started.append(deployment_id)
+            release.wait(5)
+        return build
+
+    def test_build_waits_for_cpu_and_memory_budget(self):
+        started, release = [], threading.Event()
+        self.addCleanup(release.set)
+
+        first = self.executor.submit(1, self.blocking_build(started, release), cpus=3, memory_mb=1024)
+        second = self.executor.submit(2, self.blocking_build(started, release), cpus=2, memory_mb=1024)
+
+        stats = self.executor.stats()
+        self.assertEqual((stats['active_builds'], stats['queue_depth'], stats['cpus_in_use']), (1, 1, 3))
+        release.set()
+        first.result(5)
+        second.result(5)
+        self.assertEqual(started, [1, 2])
+
+    def test_oversized_build_runs_only_on_an_idle_host(self):
+        started, release = [], threading.Event()
+        self.addCleanup(release.set)
+
+        small = self.executor.submit(1, self.blocking_build(started, release), cpus=1, memory_mb=1024)
+        huge = self.executor.submit(2, self.blocking_build(started, release), cpus=8, memory_mb=16384)
+        # Behind the oversized build in the queue, so it waits too even though it would fit
+        later = self.executor.submit(3, self.blocking_build(started, release), cpus=1, memory_mb=1024)
+
+        self.assertEqual(self.executor.stats()['queue_depth'], 2)
+        release.set()
+        for future in (small, huge, later):
+            future.result(5)
+        self.assertEqual(started, [1, 2, 3])
+
+class BuildCacheKeyTests(SimpleTestCase):
+    def setUp(self):
+        with mock.patch('docker.from_env'):
+            self.container_service = ContainerService()
+
+    def key(self, commit='a' * 40, framework='python-flask', build_inputs=None):
+        return self.container_service.build_cache_key(commit, framework, 'my-app', build_inputs={'project_id': 1, **(build_inputs or {})})
+
+    def test_same_inputs_give_same_key(self):
+        self.assertEqual(self.key(), self.key())
+
+    def test_any_build_input_changes_the_key(self):
+        keys = {
+            self.key(),
+            self.key(commit='b' * 40),
+            self.key(framework='python-django'),
+            self.key(build_inputs={'project_id': 2}),
+            self.key(build_inputs={'app_path': 'web'}),
+        }
+
+        self.assertEqual(len(keys), 5)
+
+    def test_cache_tag_is_per_project_not_per_name(self):
+        self.assertNotEqual(self.container_service.cache_tag_for(1), self.container_service.cache_tag_for(2))
+        self.assertEqual(self.container_service.cache_tag_for(1), 'project-1:cache')
+
+    def test_build_seeds_and_moves_the_project_cache_tag(self):
+        image = mock.Mock(attrs={'Size': 0})
+
+        with mock.patch.object(self.container_service, '_stream_build', return_value=(image, 0, 0)) as stream_build:
+            self.container_service._build_image(mock.Mock(streaming=True), 'my-app', 5, 'my-app:abc', ['my-app:old'], [], project_id=7)
+
+        self.assertEqual(stream_build.call_args.args[2], ['project-7:cache', 'my-app:old'])
+        image.tag.assert_called_once_with('project-7', tag='cache')
+
+class CacheMountDockerfileTests(SimpleTestCase):
+    def setUp(self):
+        with mock.patch('docker.from_env'):
+            self.container_service = ContainerService()
+
+    def test_cache_mounts_render_syntax_directive_first(self):
+        self.container_service.cache_mounts = True
+
+        dockerfile = self.container_service.dockerfile_template('python-flask', 'my-app')
+
+        self.assertEqual(dockerfile.splitlines()[0], '# syntax=docker/dockerfile:1')
+        self.assertIn('RUN --mount=type=cache,id=easy-deploy-pip,target=/root/.cache/pip pip install -r requirements.txt', dockerfile)
+
+    def test_mount_ids_follow_the_prefix(self):
+        self.container_service.cache_mounts = True
+        self.container_service.cache_mount_prefix = 'easy-deploy-benchmark-1'
+
+        dockerfile = self.container_service.dockerfile_template('node', 'my-app')
+
+        self.assertIn('RUN --mount=type=cache,id=easy-deploy-benchmark-1-npm,target=/root/.npm ', dockerfile)
+        self.assertNotIn('id=easy-deploy-npm', dockerfile)
+
+    def test_without_cache_mounts_installs_skip_the_cache(self):
+        self.container_service.cache_mounts = False
+
+        dockerfile = self.container_service.dockerfile_template('python-flask', 'my-app')
+
+        self.assertNotIn('# syntax=', dockerfile)
+        self.assertNotIn('--mount=', dockerfile)
+        self.assertIn('RUN pip install --no-cache-dir -r requirements.txt', dockerfile)
+
+    def test_buildkit_images_carry_inline_cache(self):
+        process = mock.Mock(stdout=iter([]))
+        process.wait.return_value = 0
+
+        with mock.patch('deployment.services.container_service.subprocess.Popen', return_value=process) as popen:
+            self.container_service._stream_buildkit_build(mock.Mock(streaming=False), 'my-app:abc', ['project-7:cache'], [])
+
+        command = popen.call_args.args[0]
+        self.assertIn('BUILDKIT_INLINE_CACHE=1', command)
+        self.assertEqual(command[command.index('--cache-from') + 1], 'project-7:cache')
+
+@mock.patch('deployment.services.deployment_service.ContainerService')
+class ImageCacheLookupTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='octocat', password='secret')
+        self.project = Project.objects.create(name='hello-world', repository_url='https://github.com/octocat/hello-world', owner=user)
+        self.entry = ImageCache.objects.create(
+            project=self.project, cache_key='k' * 64, image_tag='hello-world:kkkkkkkkkkkk',
+            commit_hash='a' * 40, framework_type='python-flask'
+        )
+
+    def test_hit_when_image_is_on_this_host(self, container_service):
+        container_service.return_value.image_exists.return_value = True
+
+        self.assertEqual(DeploymentService()._get_cached_image('k' * 64), self.entry)
+
+    def test_unknown_key_misses(self, container_service):
+        self.assertIsNone(DeploymentService()._get_cached_image('x' * 64))
+
+    def test_missing_local_image_misses_but_keeps_shared_entry(self, container_service):
+        container_service.return_value.image_exists.return_value = False
+
+        self.assertIsNone(DeploymentService()._get_cached_image('k' * 64))
+        self.assertTrue(ImageCache.objects.filter(pk=self.entry.pk).exists())
+
+@override_settings(IMAGE_GC_DISK_BUDGET_MB=100, IMAGE_GC_KEEP_PREVIOUS=0, IMAGE_GC_MAX_EVICTIONS_PER_PASS=5)
+class ImageGarbageCollectorTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='octocat', password='secret')
+        self.project = Project.objects.create(
+            name='app', repository_url='https://github.com/octocat/app', owner=user, last_image_tag='app:current'
+        )
+        self.docker = mock.Mock()
+        self.docker.images.prune.return_value = {}
+        self.docker.api.prune_builds.return_value = {}
+        self.images = []
+        self.containers = []
+        self.removals = {}
+        self.docker.api._result.side_effect = lambda response, json=False: self.images
+        self.docker.api.containers.side_effect = lambda all=False: self.containers
+        self.docker.api.remove_image.side_effect = lambda tag: self.removals.get(tag, [{'Untagged': tag}])
+
+    def add_image(self, tag, hours_ago, size_mb=200, shared_mb=50, running=False):
+        ImageCache.objects.create(
+            project=self.project, cache_key=tag.ljust(64, '0'), image_tag=tag, commit_hash='a' * 40,
+            framework_type='python-flask', image_size=size_mb * MB, last_used_at=timezone.now() - timedelta(hours=hours_ago)
+        )
+        image_id = f"sha256:{tag}"
+        self.images.append({'Id': image_id, 'RepoTags': [tag], 'Size': size_mb * MB, 'SharedSize': shared_mb * MB, 'Containers': -1})
+        self.removals[tag] = [{'Untagged': tag}, {'Deleted': image_id}]
+        if running:
+            self.containers.append({'ImageID': image_id})
+
+    def run_gc(self):
+        return ImageGarbageCollector(self.docker).run_once()
+
+    def removed_tags(self):
+        return [call.args[0] for call in self.docker.api.remove_image.call_args_list]
+
+    def test_usage_counts_shared_layers_once(self):
+        self.add_image('app:old', hours_ago=7)
+        self.add_image('app:recent', hours_ago=1)
+
+        usage, images = ImageGarbageCollector(self.docker).local_images()
+
+        self.assertEqual(usage, (150 + 150 + 50) * MB)
+        self.assertEqual(sorted(images), ['app:old', 'app:recent'])
+
+    def test_current_running_and_recent_images_are_protected(self):
+        self.add_image('app:current', hours_ago=9)
+        self.add_image('app:running', hours_ago=8, running=True)
+        self.add_image('app:old', hours_ago=7)
+        self.add_image('app:recent', hours_ago=1)
+
+        evicted = self.run_gc()
+
+        self.assertEqual(evicted, 1)
+        self.assertEqual(self.removed_tags(), ['app:old'])
+
+    def test_evicting_locally_keeps_the_shared_cache_entry(self):
+        self.add_image('app:old', hours_ago=7)
+        self.add_image('app:recent', hours_ago=1)
+
+        self.run_gc()
+
+        self.assertEqual(self.removed_tags(), ['app:old'])
+        self.assertTrue(ImageCache.objects.filter(image_tag='app:old').exists())
+
+    @override_settings(IMAGE_GC_DISK_BUDGET_MB=550)
+    def test_untagging_an_image_another_tag_holds_frees_nothing(self):
+        self.add_image('app:untagged', hours_ago=9)
+        self.removals['app:untagged'] = [{'Untagged': 'app:untagged'}]
+        self.add_image('app:old', hours_ago=8)
+        self.add_image('app:spare', hours_ago=7)
+        self.add_image('app:recent', hours_ago=1)
+
+        # 650 MB in use; only deleting app:old (150 MB of its own layers) brings it under the budget
+        evicted = self.run_gc()
+
+        self.assertEqual(evicted, 2)
+        self.assertEqual(self.removed_tags(), ['app:untagged', 'app:old'])
+
+    def test_images_only_other_hosts_have_are_left_alone(self):
+        self.add_image('app:old', hours_ago=7)
+        self.add_image('app:recent', hours_ago=1)
+        ImageCache.objects.create(
+            project=self.project, cache_key='e' * 64, image_tag='app:elsewhere', commit_hash='a' * 40,
+            framework_type='python-flask', image_size=500 * MB, last_used_at=timezone.now() - timedelta(hours=9)
+        )
+
+        self.run_gc()
+
+        self.assertEqual(self.removed_tags(), ['app:old'])
+
+    def test_under_budget_evicts_nothing(self):
+        self.add_image('app:old', hours_ago=7, size_mb=30, shared_mb=10)
+        self.add_image('app:recent', hours_ago=1, size_mb=30, shared_mb=10)
+
+        self.assertEqual(self.run_gc(), 0)
+        self.docker.api.remove_image.assert_not_called()
+
+    @override_settings(IMAGE_GC_INTERVAL=60)
+    def test_passes_run_at_most_once_per_interval(self):
+        image_gc = ImageGarbageCollector(self.docker)
+
+        with mock.patch.object(image_gc, 'run_once', return_value=0) as run_once:
+            image_gc.run_if_due()
+            image_gc.run_if_due()
+
+        run_once.assert_called_once_with()
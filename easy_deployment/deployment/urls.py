@@ -12,6 +12,7 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('github/login/', views.github_login, name='github_login'),
     path('github/callback/', views.github_callback, name='github_callback'),
+    path('github/webhook/', views.github_webhook, name='github_webhook'),
     path('projects/<int:project_id>/', views.project_detail, name='project_detail'),
     
     # API endpoints
@@ -8,7 +8,9 @@ from django.urls import reverse
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 from rest_framework import viewsets, permissions, status
+from rest_framework.exceptions import NotFound
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
 from .models import GithubAccount, Project, Deployment, Environment
@@ -16,6 +18,8 @@ from .serializers import ProjectSerializer, DeploymentSerializer, EnvironmentVar
 from .services.github_service import GitHubService
 from .services.deployment_service import DeploymentService
 from .services.local_project_service import LocalProjectService
+from .services.webhook_service import WebhookService
+from .tasks import build_deployment
 
 @login_required
 def dashboard(request):
@@ -136,10 +140,11 @@ def upload_project(request):
         
         if result['valid']:
             project = service.create_project(
-                result['temp_dir'],
+                result['zip_path'],
                 request.POST.get('name', project_file.name.replace('.zip', '')),
                 request.user,
-                result['framework']
+                result['framework'],
+                detection=result['detection']
             )
             return JsonResponse({
                 'success': True,
@@ -147,7 +152,7 @@ def upload_project(request):
                 'redirect_url': reverse('project_detail', args=[project.id])
             })
         
-        return JsonResponse({'error': 'Invalid project structure'}, status=400)
+        return JsonResponse({'error': result.get('error', 'Invalid project structure')}, status=400)
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -161,16 +166,45 @@ def validate_project(request):
             
         project_file = request.FILES['project_file']
         service = LocalProjectService()
-        result = service.handle_upload(project_file, request.user)
+        result = service.inspect_archive(project_file)
         
         return JsonResponse({
             'valid': result['valid'],
-            'framework': result['framework']
+            'framework': result['framework'],
+            'app_path': result.get('app_path', ''),
+            'error': result.get('error')
         })
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def github_webhook(request):
+    """Queue deployments from signed GitHub push webhooks"""
+    service = WebhookService(settings.GITHUB_WEBHOOK_SECRET)
+    if not service.verify_signature(request.body, request.headers.get('X-Hub-Signature-256')):
+        return JsonResponse({'error': 'Invalid signature'}, status=403)
+    
+    event = request.headers.get('X-GitHub-Event')
+    if event == 'ping':
+        return JsonResponse({'status': 'pong'})
+    if event != 'push':
+        return JsonResponse({'status': 'ignored', 'event': event}, status=202)
+    
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON payload'}, status=400)
+    
+    deployments = service.handle_push(payload)
+    return JsonResponse({'status': 'queued', 'deployments': [deployment.id for deployment in deployments]}, status=202)
+
+class RepositoryPagination(PageNumberPagination):
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 class ProjectViewSet(viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -186,8 +220,11 @@ class ProjectViewSet(viewsets.ModelViewSet):
         project = self.get_object()
         
         try:
-            # Get GitHub account
-            github_account = GithubAccount.objects.get(user=request.user)
+            # Get GitHub account; uploaded projects are deployed without one
+            if project.repository_url.startswith('local://'):
+                github_account = GithubAccount.objects.filter(user=request.user).first()
+            else:
+                github_account = GithubAccount.objects.get(user=request.user)
             
             # Create deployment service
             deployment_service = DeploymentService(github_account)
@@ -198,10 +235,10 @@ class ProjectViewSet(viewsets.ModelViewSet):
             # Create deployment
             deployment = deployment_service.create_deployment(project, environment_name=environment_name)
             
-            # Start deployment process (this could be moved to a Celery task)
-            deployment = deployment_service.start_deployment_process(deployment)
+            # Build and release run on Celery workers; clients follow progress through the deployment
+            build_deployment.delay(deployment.id)
             
-            return Response(DeploymentSerializer(deployment).data)
+            return Response(DeploymentSerializer(deployment).data, status=status.HTTP_202_ACCEPTED)
             
         except GithubAccount.DoesNotExist:
             return Response(
@@ -214,18 +251,35 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=True, methods=['get'])
-    def github_repos(self, request, pk=None):
+    @action(detail=False, methods=['get'])
+    def github_repos(self, request):
+        """List the user's repositories; ?q= filters by name or description, ?page=/?page_size= paginate"""
         try:
             github_account = GithubAccount.objects.get(user=request.user)
             github_service = GitHubService(github_account.access_token)
-            repos = github_service.get_user_repos()
-            return Response(repos)
+            repos = github_service.get_cached_user_repos()
+            
+            query = request.query_params.get('q', '').strip().lower()
+            if query:
+                repos = [
+                    repo for repo in repos
+                    if query in repo['full_name'].lower() or query in (repo.get('description') or '').lower()
+                ]
+            
+            # Without paging parameters the whole list is returned, as the repository picker expects
+            if not {'q', 'page', 'page_size'} & set(request.query_params):
+                return Response(repos)
+            
+            paginator = RepositoryPagination()
+            page = paginator.paginate_queryset(repos, request, view=self)
+            return paginator.get_paginated_response(page)
         except GithubAccount.DoesNotExist:
             return Response(
                 {"error": "GitHub account not connected"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except NotFound as e:
+            return Response({"error": str(e.detail)}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response(
                 {"error": str(e)},
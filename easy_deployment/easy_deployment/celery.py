@@ -2,9 +2,9 @@ import os
 from celery import Celery
 
 # Set the default Django settings module for the 'celery' program.
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vercel_clone.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'easy_deployment.settings')
 
-app = Celery('vercel_clone')
+app = Celery('easy_deployment')
 
 # Using a string here means the worker doesn't have to serialize
 # the configuration object to child processes.
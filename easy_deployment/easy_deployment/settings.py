@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -135,15 +136,116 @@ GITHUB_CLIENT_SECRET = os.getenv('GITHUB_CLIENT_SECRET')
 GITHUB_REDIRECT_URI = 'http://127.0.0.1:8000/github/callback/'
 GITHUB_SCOPES = 'repo read:user user:email'
 
+# Shared secret configured on the repository's push webhook (requests without a valid signature are rejected)
+GITHUB_WEBHOOK_SECRET = os.getenv('GITHUB_WEBHOOK_SECRET', '')
+
+# Keep-alive connections to the GitHub API shared by all requests in a process
+GITHUB_HTTP_POOL_SIZE = int(os.getenv('GITHUB_HTTP_POOL_SIZE', '10'))
+
+# GitHub API responses kept for If-None-Match revalidation (entries, seconds)
+GITHUB_ETAG_CACHE_SIZE = int(os.getenv('GITHUB_ETAG_CACHE_SIZE', '1000'))
+GITHUB_ETAG_CACHE_TTL = int(os.getenv('GITHUB_ETAG_CACHE_TTL', '3600'))
+
+# GitHub calls per token are paced by a token bucket (burst size), wait at most N seconds, retry rate limits N times
+GITHUB_RATE_LIMIT_BURST = int(os.getenv('GITHUB_RATE_LIMIT_BURST', '20'))
+GITHUB_RATE_LIMIT_MAX_WAIT = int(os.getenv('GITHUB_RATE_LIMIT_MAX_WAIT', '300'))
+GITHUB_RATE_LIMIT_MAX_RETRIES = int(os.getenv('GITHUB_RATE_LIMIT_MAX_RETRIES', '3'))
+
+# Repository listings: pages fetched in parallel, seconds before a background refresh, seconds kept at most
+GITHUB_PAGE_FETCH_CONCURRENCY = int(os.getenv('GITHUB_PAGE_FETCH_CONCURRENCY', '4'))
+GITHUB_REPO_LIST_REFRESH = int(os.getenv('GITHUB_REPO_LIST_REFRESH', '300'))
+GITHUB_REPO_LIST_TTL = int(os.getenv('GITHUB_REPO_LIST_TTL', '86400'))
+
 # Deployment settings
 BASE_CONTAINER_PORT = int(os.getenv('BASE_CONTAINER_PORT', '8000'))
 DEPLOYMENT_DOMAIN = os.getenv('DEPLOYMENT_DOMAIN', 'localhost')
 NGINX_PROXY_NETWORK = os.getenv('NGINX_PROXY_NETWORK', 'web')
 
+# Uploaded project archives are rejected when their extracted size would exceed this
+LOCAL_UPLOAD_MAX_UNCOMPRESSED_MB = int(os.getenv('LOCAL_UPLOAD_MAX_UNCOMPRESSED_MB', '2048'))
+
+# Content-addressed store holding the files of uploaded projects, deduplicated across uploads
+SOURCE_STORE_DIR = os.getenv('SOURCE_STORE_DIR', os.path.join(BASE_DIR, 'projects', 'store'))
+
+# Fetch only the deployment's commit with depth 1; optionally as a partial clone (e.g. GIT_CLONE_FILTER=blob:none)
+GIT_SHALLOW_CLONE = os.getenv('GIT_SHALLOW_CLONE', 'True') == 'True'
+GIT_CLONE_FILTER = os.getenv('GIT_CLONE_FILTER', '')
+
+# Keep a bare mirror per repository on the worker and export deployments from it (size-bounded, LRU)
+GIT_MIRROR_CACHE = os.getenv('GIT_MIRROR_CACHE', 'False') == 'True'
+GIT_MIRROR_CACHE_DIR = os.getenv('GIT_MIRROR_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'easy-deploy-mirrors'))
+GIT_MIRROR_CACHE_MAX_MB = int(os.getenv('GIT_MIRROR_CACHE_MAX_MB', '20480'))
+
+# Stream the commit's GitHub tarball straight into the Docker build instead of cloning (needs a known framework)
+GITHUB_ARCHIVE_BUILDS = os.getenv('GITHUB_ARCHIVE_BUILDS', 'False') == 'True'
+
+# Build output is appended to the deployment log every N lines or every N seconds, whichever comes first
+DEPLOYMENT_LOG_BATCH_LINES = int(os.getenv('DEPLOYMENT_LOG_BATCH_LINES', '50'))
+DEPLOYMENT_LOG_FLUSH_INTERVAL = float(os.getenv('DEPLOYMENT_LOG_FLUSH_INTERVAL', '0.5'))
+
+# Build generated Dockerfiles with BuildKit cache mounts for pip, npm and Maven downloads
+DOCKER_BUILD_CACHE_MOUNTS = os.getenv('DOCKER_BUILD_CACHE_MOUNTS', 'False') == 'True'
+
+# Build executor: concurrent builds per worker and the host budget they are admitted against (0 = detect)
+BUILD_MAX_CONCURRENCY = int(os.getenv('BUILD_MAX_CONCURRENCY', '4'))
+BUILD_CPU_BUDGET = int(os.getenv('BUILD_CPU_BUDGET', '0'))
+BUILD_MEMORY_BUDGET_MB = int(os.getenv('BUILD_MEMORY_BUDGET_MB', '0'))
+
+# Deployment claims: how long (seconds) a worker's claim lasts without renewal, and this worker's id ('' = host-pid)
+DEPLOYMENT_LEASE_SECONDS = int(os.getenv('DEPLOYMENT_LEASE_SECONDS', '60'))
+WORKER_ID = os.getenv('WORKER_ID', '')
+
+# Workers wait on this PostgreSQL NOTIFY channel for new deployments, polling every N seconds for missed notifications
+DEPLOYMENT_NOTIFY_CHANNEL = os.getenv('DEPLOYMENT_NOTIFY_CHANNEL', 'deployment_queued')
+WORKER_FALLBACK_POLL_INTERVAL = int(os.getenv('WORKER_FALLBACK_POLL_INTERVAL', '60'))
+
+# Scheduler: priority classes highest first (environments not listed fall in the last one), seconds of waiting that
+# lift a deployment one class, concurrent deployments per owner, owner fair-share weights ("alice:2,bob:1"),
+# how many queued deployments each claim considers, how long (seconds) a capped owner's Celery build waits between
+# retries, and how many retries it makes before leaving the deployment to polling workers and later build tasks
+SCHEDULER_PRIORITY_CLASSES = os.getenv('SCHEDULER_PRIORITY_CLASSES', 'production,staging,preview').split(',')
+SCHEDULER_AGING_SECONDS = int(os.getenv('SCHEDULER_AGING_SECONDS', '600'))
+SCHEDULER_MAX_PER_OWNER = int(os.getenv('SCHEDULER_MAX_PER_OWNER', '2'))
+SCHEDULER_OWNER_WEIGHTS = {
+    username: float(weight)
+    for username, _, weight in (item.partition(':') for item in os.getenv('SCHEDULER_OWNER_WEIGHTS', '').split(',') if item)
+}
+SCHEDULER_WINDOW = int(os.getenv('SCHEDULER_WINDOW', '200'))
+SCHEDULER_OWNER_CAP_RETRY_DELAY = int(os.getenv('SCHEDULER_OWNER_CAP_RETRY_DELAY', '15'))
+SCHEDULER_OWNER_CAP_MAX_RETRIES = int(os.getenv('SCHEDULER_OWNER_CAP_MAX_RETRIES', '240'))
+
+# Cancel a running build once a newer deployment of the same project and environment is queued
+CANCEL_SUPERSEDED_BUILDS = os.getenv('CANCEL_SUPERSEDED_BUILDS', 'False') == 'True'
+
+# Image garbage collection: disk budget for deployment images, images kept per project for rollback,
+# evictions per pass, and how often (seconds) dangling images and build cache are pruned
+IMAGE_GC_DISK_BUDGET_MB = int(os.getenv('IMAGE_GC_DISK_BUDGET_MB', '51200'))
+IMAGE_GC_KEEP_PREVIOUS = int(os.getenv('IMAGE_GC_KEEP_PREVIOUS', '3'))
+IMAGE_GC_MAX_EVICTIONS_PER_PASS = int(os.getenv('IMAGE_GC_MAX_EVICTIONS_PER_PASS', '5'))
+IMAGE_GC_PRUNE_INTERVAL = int(os.getenv('IMAGE_GC_PRUNE_INTERVAL', '3600'))
+IMAGE_GC_BUILD_CACHE_BUDGET_MB = int(os.getenv('IMAGE_GC_BUILD_CACHE_BUDGET_MB', '10240'))
+# Seconds between image garbage collection passes on each build host
+IMAGE_GC_INTERVAL = int(os.getenv('IMAGE_GC_INTERVAL', '60'))
+
+# Pre-pull the generated Dockerfiles' base images when a worker starts and refresh them every N seconds
+BASE_IMAGE_PREPULL = os.getenv('BASE_IMAGE_PREPULL', 'True') == 'True'
+BASE_IMAGE_REFRESH_INTERVAL = int(os.getenv('BASE_IMAGE_REFRESH_INTERVAL', '21600'))
+
 # Celery settings
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = TIME_ZONE
\ No newline at end of file
+CELERY_TIMEZONE = TIME_ZONE
+
+# Builds run for minutes on their own workers, so container starts on the runtime queue never wait behind them
+CELERY_TASK_ROUTES = {
+    'deployment.tasks.build_deployment': {'queue': 'build'},
+    'deployment.tasks.release_deployment': {'queue': 'runtime'},
+}
+# Long tasks: a worker only reserves the task it is about to run
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Seconds before a build task retries a deployment that is waiting on GitHub's rate limit
+DEPLOYMENT_RATE_LIMIT_RETRY_DELAY = int(os.getenv('DEPLOYMENT_RATE_LIMIT_RETRY_DELAY', '60'))
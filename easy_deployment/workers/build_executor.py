@@ -0,0 +1,140 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Rough CPU/memory (MB) a build needs, by framework family
+BUILD_RESOURCE_ESTIMATES = {
+    'java': (4, 4096),
+    'mern': (2, 2048),
+    'node': (2, 2048),
+    'python': (1, 1024),
+    'lamp': (1, 1024),
+    'static': (1, 256),
+}
+DEFAULT_BUILD_RESOURCES = (1, 1024)
+
+def estimate_build_resources(framework):
+    """Return the (cpus, memory_mb) a build for this framework is expected to use"""
+    return BUILD_RESOURCE_ESTIMATES.get((framework or '').split('-')[0], DEFAULT_BUILD_RESOURCES)
+
+def detect_host_memory_mb():
+    """Return the physical memory of this host in MB"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 4096
+
+class BuildJob:
+    def __init__(self, deployment_id, fn, cpus, memory_mb):
+        self.deployment_id = deployment_id
+        self.fn = fn
+        self.cpus = cpus
+        self.memory_mb = memory_mb
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+class BuildExecutor:
+    """Runs builds on a thread pool, admitting each one against the host CPU and memory budget"""
+
+    def __init__(self, max_concurrency=None, cpu_budget=None, memory_budget_mb=None):
+        self.max_concurrency = max_concurrency or settings.BUILD_MAX_CONCURRENCY
+        self.cpu_budget = cpu_budget or settings.BUILD_CPU_BUDGET or os.cpu_count() or 1
+        self.memory_budget_mb = memory_budget_mb or settings.BUILD_MEMORY_BUDGET_MB or detect_host_memory_mb()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='build')
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._active = {}
+        self._cpus_in_use = 0
+        self._memory_in_use_mb = 0
+        self._wait_times = deque(maxlen=200)
+
+    def submit(self, deployment_id, fn, cpus=1, memory_mb=1024):
+        """Queue a build; it starts as soon as it fits within the concurrency and resource budget"""
+        job = BuildJob(deployment_id, fn, cpus, memory_mb)
+        with self._lock:
+            self._queue.append(job)
+            self._admit_locked()
+        return job.future
+
+    def is_tracked(self, deployment_id):
+        """Whether a deployment is queued or building in this executor"""
+        with self._lock:
+            return deployment_id in self._active or any(job.deployment_id == deployment_id for job in self._queue)
+
+    def tracked_ids(self):
+        """Deployments queued or building in this executor"""
+        with self._lock:
+            return set(self._active) | {job.deployment_id for job in self._queue}
+
+    def free_slots(self):
+        """How many more builds this executor can take without queueing them"""
+        with self._lock:
+            return max(self.max_concurrency - len(self._active) - len(self._queue), 0)
+
+    def stats(self):
+        """Snapshot of queue depth, active builds, resource usage and admission wait times"""
+        with self._lock:
+            now = time.monotonic()
+            waits = list(self._wait_times)
+            return {
+                'queue_depth': len(self._queue),
+                'active_builds': len(self._active),
+                'cpus_in_use': self._cpus_in_use,
+                'cpu_budget': self.cpu_budget,
+                'memory_in_use_mb': self._memory_in_use_mb,
+                'memory_budget_mb': self.memory_budget_mb,
+                'oldest_queued_seconds': now - self._queue[0].queued_at if self._queue else 0.0,
+                'avg_wait_seconds': sum(waits) / len(waits) if waits else 0.0,
+                'max_wait_seconds': max(waits) if waits else 0.0,
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def _fits_locked(self, job):
+        if len(self._active) >= self.max_concurrency:
+            return False
+        # A build larger than the whole budget may still run, but only on an otherwise idle host
+        if not self._active:
+            return True
+        return (self._cpus_in_use + job.cpus <= self.cpu_budget and
+                self._memory_in_use_mb + job.memory_mb <= self.memory_budget_mb)
+
+    def _admit_locked(self):
+        # Admit strictly in queue order so large builds are not starved by a stream of small ones
+        while self._queue and self._fits_locked(self._queue[0]):
+            job = self._queue.popleft()
+            self._active[job.deployment_id] = job
+            self._cpus_in_use += job.cpus
+            self._memory_in_use_mb += job.memory_mb
+            self._wait_times.append(time.monotonic() - job.queued_at)
+            self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        result = error = None
+        try:
+            result = job.fn(job.deployment_id)
+        except Exception as e:
+            logger.error(f"Build for deployment {job.deployment_id} raised: {str(e)}")
+            error = e
+        finally:
+            # Pool threads are long-lived, so do not keep a connection open between builds
+            connection.close()
+            with self._lock:
+                self._active.pop(job.deployment_id, None)
+                self._cpus_in_use -= job.cpus
+                self._memory_in_use_mb -= job.memory_mb
+                self._admit_locked()
+
+        # Resolve only once the slot is free, so done callbacks see it and can fill it straight away
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
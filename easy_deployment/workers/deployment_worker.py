@@ -2,37 +2,43 @@ import os
 import logging
 import time
 from django.conf import settings
-from deployment.models import Deployment
-from deployment.services.github_service import GitHubService
+from deployment.models import Deployment, GithubAccount
 from deployment.services.deployment_service import DeploymentService
 from deployment.services.container_service import ContainerService
+from deployment.services.deployment_queue import DeploymentQueue, QueueListener
+from workers.build_executor import BuildExecutor, estimate_build_resources
+from workers.image_gc import ImageGarbageCollector
+from workers.image_warmer import BaseImageWarmer
+from workers.scheduler import FairScheduler
 
 logger = logging.getLogger(__name__)
 
 class DeploymentWorker:
     """Worker to handle deployment jobs"""
     
+    def __init__(self, queue=None):
+        self.queue = queue or DeploymentQueue()
+    
     def process_deployment(self, deployment_id):
         """Process a single deployment"""
         try:
             # Get deployment
             deployment = Deployment.objects.get(id=deployment_id)
             
-            # Check if deployment is in pending status
-            if deployment.status != 'pending':
-                logger.info(f"Deployment {deployment_id} is not in pending status, skipping")
+            # The claim may have been lost while the build waited for a slot
+            if deployment.status != 'building' or deployment.worker_id != self.queue.worker_id:
+                logger.info(f"Deployment {deployment_id} is no longer claimed by this worker, skipping")
                 return
             
-            # Get GitHub account
-            github_account = deployment.project.owner.github_account
+            # Get GitHub account; uploaded projects are deployed without one
+            github_account = GithubAccount.objects.filter(user=deployment.project.owner).first()
             
             # Create services
-            github_service = GitHubService(github_account.access_token)
             deployment_service = DeploymentService(github_account)
             
             # Start the deployment process
             logger.info(f"Starting deployment process for deployment {deployment_id}")
-            deployment = deployment_service.start_deployment_process(deployment)
+            deployment = deployment_service.start_deployment_process(deployment, self.queue.cancel_event(deployment_id))
             
             logger.info(f"Deployment {deployment_id} completed with status: {deployment.status}")
             
@@ -49,24 +55,65 @@ class DeploymentWorker:
                 deployment.save()
             except:
                 pass
+        finally:
+            self.queue.forget(deployment_id)
 
 def run_worker():
     """Run the deployment worker process"""
-    worker = DeploymentWorker()
+    queue = DeploymentQueue()
+    listener = QueueListener()
+    scheduler = FairScheduler()
+    worker = DeploymentWorker(queue)
+    executor = BuildExecutor()
+    # Builds fill this host's disk, so this host evicts its own unused images
+    image_gc = ImageGarbageCollector()
+    
+    logger.info(f"Starting deployment worker {queue.worker_id} with {executor.max_concurrency} build slots, "
+                f"{executor.cpu_budget} CPUs and {executor.memory_budget_mb} MB budget...")
     
-    logger.info("Starting deployment worker...")
+    # Warm the base images in the background so the first build on this worker does not pay for the pulls
+    warmer = None
+    if settings.BASE_IMAGE_PREPULL:
+        warmer = BaseImageWarmer()
+        warmer.start()
     
     while True:
         try:
-            # Get pending deployments
-            pending_deployments = Deployment.objects.filter(status='pending')
+            # Keep the leases on everything this worker holds, whether it is building or waiting for a slot
+            for deployment_id in queue.renew(executor.tracked_ids()):
+                # Another worker took over; stop building so the two do not race
+                queue.cancel_event(deployment_id).set()
+            
+            # Only claim what this worker can start now, leaving the rest to other workers
+            claimed = queue.claim(executor.free_slots(), scheduler=scheduler)
+            if claimed:
+                logger.info(f"Scheduler: {scheduler.stats()}")
+            for deployment in claimed:
+                if executor.is_tracked(deployment.id):
+                    continue
+                
+                logger.info(f"Claimed deployment {deployment.id}")
+                cpus, memory_mb = estimate_build_resources(deployment.project.framework_type)
+                future = executor.submit(deployment.id, worker.process_deployment, cpus=cpus, memory_mb=memory_mb)
+                # A finished build frees a slot, so look for more work straight away
+                future.add_done_callback(lambda _: listener.wake())
             
-            for deployment in pending_deployments:
-                logger.info(f"Processing deployment {deployment.id}")
-                worker.process_deployment(deployment.id)
+            stats = executor.stats()
+            if stats['queue_depth'] or stats['active_builds']:
+                logger.info(f"Build executor: {stats}")
+                if warmer:
+                    logger.info(f"Base image pulls: {warmer.stats()}")
+            
+            try:
+                image_gc.run_if_due()
+            except Exception as e:
+                logger.error(f"Image GC error: {str(e)}")
             
-            # Sleep for a while before checking again
-            time.sleep(5)
+            # Sleep until a deployment is queued or a build finishes; wake earlier only to renew held leases
+            timeout = settings.WORKER_FALLBACK_POLL_INTERVAL
+            if executor.tracked_ids():
+                timeout = min(timeout, queue.lease_seconds / 3)
+            listener.wait(timeout)
             
         except Exception as e:
             logger.error(f"Worker error: {str(e)}")
@@ -0,0 +1,130 @@
+import time
+import logging
+import docker
+from django.conf import settings
+from deployment.models import ImageCache, Project
+
+logger = logging.getLogger(__name__)
+
+class ImageGarbageCollector:
+    """Evicts least recently used deployment images once the disk budget is exceeded"""
+
+    def __init__(self, docker_client=None):
+        self.docker_client = docker_client or docker.from_env()
+        self.disk_budget = settings.IMAGE_GC_DISK_BUDGET_MB * 1024 * 1024
+        self.keep_previous = settings.IMAGE_GC_KEEP_PREVIOUS
+        self.max_evictions = settings.IMAGE_GC_MAX_EVICTIONS_PER_PASS
+        self.prune_interval = settings.IMAGE_GC_PRUNE_INTERVAL
+        self.build_cache_budget = settings.IMAGE_GC_BUILD_CACHE_BUDGET_MB * 1024 * 1024
+        self.interval = settings.IMAGE_GC_INTERVAL
+        self._last_prune = 0
+        self._last_run = None
+
+    def protected_images(self, local_images=None, in_use=None):
+        """Image tags that must survive: each project's current image, its N previous ones and any a container uses"""
+        protected = set(
+            Project.objects.exclude(last_image_tag='').values_list('last_image_tag', flat=True)
+        )
+        for project_id in ImageCache.objects.values_list('project_id', flat=True).distinct():
+            protected.update(
+                ImageCache.objects.filter(project_id=project_id)
+                .order_by('-last_used_at')
+                .values_list('image_tag', flat=True)[:self.keep_previous + 1]
+            )
+        # Running and stopped containers both pin their image on this host
+        protected.update(
+            tag for tag, image in (local_images or {}).items() if image.get('Id') in (in_use or set())
+        )
+        return protected
+
+    def local_images(self):
+        """Estimated bytes of image layers on this host and its images by tag
+
+        Each image's own layers are counted once, and the layers images share are counted once as the largest shared set.
+        """
+        # Lists images only, unlike `docker system df`, which also measures every volume and the build cache
+        api = self.docker_client.api
+        summaries = api._result(api._get(api._url('/images/json'), params={'shared-size': 1}), True) or []
+        own = 0
+        shared = 0
+        for image in summaries:
+            # Daemons that do not compute shared sizes report -1
+            image_shared = max(image.get('SharedSize') or 0, 0)
+            own += max((image.get('Size') or 0) - image_shared, 0)
+            shared = max(shared, image_shared)
+        images = {tag: image for image in summaries for tag in image.get('RepoTags') or []}
+        return own + shared, images
+
+    def images_in_use(self):
+        """Ids of the images that containers on this host, running or stopped, were created from"""
+        return {container.get('ImageID') for container in self.docker_client.api.containers(all=True)}
+
+    def run_if_due(self):
+        """Run a pass when IMAGE_GC_INTERVAL seconds have passed since the last one; returns the number of images evicted"""
+        if self._last_run is not None and time.monotonic() - self._last_run < self.interval:
+            return 0
+        self._last_run = time.monotonic()
+        return self.run_once()
+
+    def run_once(self):
+        """Run one bounded collection pass; returns the number of images evicted"""
+        evicted = 0
+        usage, local_images = self.local_images()
+
+        if usage > self.disk_budget:
+            protected = self.protected_images(local_images, self.images_in_use())
+            # Cache entries are shared by every build host; only images stored here can free space here
+            candidates = (
+                ImageCache.objects.filter(image_tag__in=list(local_images))
+                .exclude(image_tag__in=protected)
+                .order_by('last_used_at')
+            )
+
+            # Evict a few images per pass so the collector never stalls builds on this host
+            for cached_image in candidates[:self.max_evictions]:
+                if usage <= self.disk_budget:
+                    break
+                freed = self._remove_image(cached_image, local_images[cached_image.image_tag])
+                if freed is not None:
+                    usage -= freed
+                    evicted += 1
+
+            logger.info(f"Image GC evicted {evicted} images, local usage now {usage / (1024 * 1024):.0f} MB "
+                        f"of {self.disk_budget / (1024 * 1024):.0f} MB budget")
+
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            self._last_prune = time.monotonic()
+            self.prune_dangling()
+
+        return evicted
+
+    def prune_dangling(self):
+        """Remove dangling images and trim the build cache down to its budget"""
+        try:
+            result = self.docker_client.images.prune(filters={'dangling': True})
+            reclaimed = result.get('SpaceReclaimed') or 0
+            result = self.docker_client.api.prune_builds(keep_storage=self.build_cache_budget)
+            reclaimed += result.get('SpaceReclaimed') or 0
+            logger.info(f"Pruned dangling images and build cache, reclaimed {reclaimed / (1024 * 1024):.0f} MB")
+        except docker.errors.APIError as e:
+            logger.error(f"Error pruning dangling images and build cache: {str(e)}")
+
+    def _remove_image(self, cached_image, image):
+        """Remove a cached image's tag from this host; returns the bytes freed, or None if it could not be removed"""
+        try:
+            removed = self.docker_client.api.remove_image(cached_image.image_tag) or []
+        except docker.errors.ImageNotFound:
+            removed = []
+        except docker.errors.APIError as e:
+            # Typically the image still backs a container; try again on a later pass
+            logger.warning(f"Could not remove image {cached_image.image_tag}: {str(e)}")
+            return None
+
+        # While another tag, such as the project's cache tag, still points at the image, removing this one only untags it
+        deleted = any(entry.get('Deleted') == image.get('Id') for entry in removed)
+        freed = max((image.get('Size') or 0) - max(image.get('SharedSize') or 0, 0), 0) if deleted else 0
+
+        # The cache entry stays: other build hosts may still hold the image, and a miss here only means a rebuild here
+        logger.info(f"Evicted image {cached_image.image_tag} (last used {cached_image.last_used_at}), "
+                    f"freed {freed / (1024 * 1024):.0f} MB")
+        return freed
@@ -0,0 +1,61 @@
+import time
+import logging
+import threading
+import docker
+from django.conf import settings
+from deployment.services.container_service import ContainerService
+
+logger = logging.getLogger(__name__)
+
+class BaseImageWarmer:
+    """Pre-pulls the base images used by the generated Dockerfiles and keeps them fresh"""
+
+    def __init__(self, container_service=None, refresh_interval=None):
+        self.container_service = container_service or ContainerService()
+        self.refresh_interval = refresh_interval or settings.BASE_IMAGE_REFRESH_INTERVAL
+        self.ready = threading.Event()
+        self._timings = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start pulling in the background; builds can run while warm-up is in progress"""
+        self._thread = threading.Thread(target=self._run, name='base-image-warmer', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stats(self):
+        """Per-image pull timings from the most recent pass"""
+        with self._lock:
+            return {image: dict(timing) for image, timing in self._timings.items()}
+
+    def pull_all(self):
+        """Pull every base image once, recording how long each pull took"""
+        images = self.container_service.base_images()
+        started = time.monotonic()
+        for image in images:
+            pull_started = time.monotonic()
+            error = None
+            try:
+                self.container_service.docker_client.images.pull(image)
+            except docker.errors.APIError as e:
+                error = str(e)
+                logger.error(f"Error pulling base image {image}: {error}")
+
+            seconds = time.monotonic() - pull_started
+            with self._lock:
+                self._timings[image] = {'seconds': seconds, 'pulled_at': time.time(), 'error': error}
+            if not error:
+                logger.info(f"Pulled base image {image} in {seconds:.1f}s")
+
+        logger.info(f"Base image warm-up of {len(images)} images finished in {time.monotonic() - started:.1f}s")
+
+    def _run(self):
+        while True:
+            try:
+                self.pull_all()
+            except Exception as e:
+                logger.error(f"Base image warm-up error: {str(e)}")
+            finally:
+                self.ready.set()
+            time.sleep(self.refresh_interval)
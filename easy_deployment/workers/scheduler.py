@@ -0,0 +1,84 @@
+import logging
+import threading
+from collections import deque
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+class FairScheduler:
+    """Picks which queued deployments to claim: priority class first, then weighted fair share between owners"""
+
+    def __init__(self, classes=None, aging_seconds=None, max_per_owner=None, owner_weights=None):
+        self.classes = classes or settings.SCHEDULER_PRIORITY_CLASSES
+        self.aging_seconds = settings.SCHEDULER_AGING_SECONDS if aging_seconds is None else aging_seconds
+        self.max_per_owner = max_per_owner or settings.SCHEDULER_MAX_PER_OWNER
+        self.owner_weights = settings.SCHEDULER_OWNER_WEIGHTS if owner_weights is None else owner_weights
+        self._lock = threading.Lock()
+        self._waits = {name: deque(maxlen=500) for name in self.classes}
+        self._claimed = dict.fromkeys(self.classes, 0)
+        self._waiting = dict.fromkeys(self.classes, 0)
+
+    def priority_class(self, environment_name):
+        return environment_name if environment_name in self.classes else self.classes[-1]
+
+    def _rank(self, candidate, now):
+        rank = self.classes.index(self.priority_class(candidate['environment__name']))
+        # Long waits lift a deployment towards the top class so lower classes are never starved outright
+        if self.aging_seconds:
+            rank -= int((now - candidate['created_at']).total_seconds() // self.aging_seconds)
+        return max(rank, 0)
+
+    def _share(self, candidate, running):
+        owner = candidate['project__owner_id']
+        weight = self.owner_weights.get(candidate['project__owner__username'], 1.0)
+        return running.get(owner, 0) / weight
+
+    def choose(self, candidates, running, limit):
+        """Return the ids to claim, in order, from candidates given each owner's running deployments"""
+        now = timezone.now()
+        running = dict(running)
+        remaining = list(candidates)
+        chosen = []
+
+        while remaining and len(chosen) < limit:
+            eligible = [
+                candidate for candidate in remaining
+                if running.get(candidate['project__owner_id'], 0) < self.max_per_owner
+            ]
+            if not eligible:
+                break
+            best = min(eligible, key=lambda candidate: (
+                self._rank(candidate, now), self._share(candidate, running), candidate['created_at'], candidate['id']
+            ))
+            chosen.append(best)
+            remaining.remove(best)
+            running[best['project__owner_id']] = running.get(best['project__owner_id'], 0) + 1
+
+        self._record(chosen, remaining, now)
+        return [candidate['id'] for candidate in chosen]
+
+    def _record(self, chosen, remaining, now):
+        with self._lock:
+            for candidate in chosen:
+                name = self.priority_class(candidate['environment__name'])
+                self._claimed[name] += 1
+                self._waits[name].append((now - candidate['created_at']).total_seconds())
+            self._waiting = dict.fromkeys(self.classes, 0)
+            for candidate in remaining:
+                self._waiting[self.priority_class(candidate['environment__name'])] += 1
+
+    def stats(self):
+        """Per priority class: deployments claimed and still waiting, and queue wait times of recent claims"""
+        with self._lock:
+            stats = {}
+            for name in self.classes:
+                waits = sorted(self._waits[name])
+                stats[name] = {
+                    'claimed': self._claimed[name],
+                    'waiting': self._waiting[name],
+                    'avg_wait_seconds': sum(waits) / len(waits) if waits else 0.0,
+                    'p95_wait_seconds': waits[int(len(waits) * 0.95)] if waits else 0.0,
+                    'max_wait_seconds': waits[-1] if waits else 0.0,
+                }
+            return stats